@@ -0,0 +1,81 @@
+"""
+Report worker cold-start import time and RSS, with and without API_ONLY.
+
+    python benchmarks/bench_boot.py --runs 5
+    python benchmarks/bench_boot.py --runs 5 --top 15
+
+Each run imports the app in a fresh interpreter under `python -X importtime`,
+the way a gunicorn worker does without --preload, and records the total
+import time of `app`, the process's peak RSS after the import, and which
+of the optional heavy packages got loaded. --top lists the top-level
+packages with the most import time of their own in the last run of each
+mode.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+MODES = {
+    'default': {'API_ONLY': '0'},
+    'api-only': {'API_ONLY': '1'},
+}
+
+# packages an API-only worker should not need at boot
+HEAVY = ('flask_admin', 'wtforms', 'flask_swagger', 'yaml', 'flask_migrate', 'alembic')
+
+PROBE = (
+    "import resource, sys\n"
+    "import app\n"
+    "print('rss', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    "print('loaded', *[name for name in sys.argv[1:] if name in sys.modules])\n"
+)
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| *(\S+)$')
+
+
+def boot(env):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE, *HEAVY],
+        cwd=SRC, env={**os.environ, **env}, capture_output=True, text=True, check=True)
+    report = {line.split()[0]: line.split()[1:] for line in result.stdout.splitlines()}
+
+    app_us = 0
+    packages = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, name = int(match.group(1)), int(match.group(2)), match.group(3)
+            # self time summed per top-level package, so each counts once
+            root = name.split('.')[0]
+            packages[root] = packages.get(root, 0) + self_us
+            if name == 'app':
+                app_us = cumulative_us
+    return app_us / 1000, int(report['rss'][0]) / 1024, report['loaded'], packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'mode':10} {'import ms':>10} {'rss MB':>8}  heavy packages loaded")
+    for mode, env in MODES.items():
+        samples = [boot(env) for _ in range(args.runs)]
+        import_ms = statistics.median(sample[0] for sample in samples)
+        rss_mb = statistics.median(sample[1] for sample in samples)
+        loaded = samples[-1][2]
+        print(f"{mode:10} {import_ms:10.1f} {rss_mb:8.1f}  {', '.join(loaded) or '-'}")
+        if args.top:
+            packages = sorted(samples[-1][3].items(), key=lambda item: -item[1])[:args.top]
+            for name, self_us in packages:
+                print(f"{'':10} {self_us / 1000:10.1f}  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Measure POST /user throughput for different password work factors.
+
+    python benchmarks/bench_passwords.py --users 40 --threads 1 4 --iterations 100000 600000
+
+Each run creates --users users through the in-process test client, split
+across --threads client threads, against a throwaway SQLite database.
+Hashing runs on the app's bounded pool (PASSWORD_HASH_WORKERS), so extra
+client threads only help up to that many concurrent hashes.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'bench_passwords.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from app import app  # noqa: E402
+from models import db  # noqa: E402
+from passwords import password_hasher  # noqa: E402
+
+
+def create_users(count, threads, prefix):
+    per_thread = [count // threads + (1 if i < count % threads else 0) for i in range(threads)]
+    failures = []
+
+    def worker(index, total):
+        client = app.test_client()
+        for n in range(total):
+            name = f'{prefix}-{index}-{n}'
+            response = client.post('/user', json={
+                'email': f'{name}@example.com', 'username': name, 'password': 'correct horse'})
+            if response.status_code != 201:
+                failures.append(response.status_code)
+
+    workers = [threading.Thread(target=worker, args=(i, total)) for i, total in enumerate(per_thread)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--iterations', type=int, nargs='+', default=[100000, 300000, 600000])
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    print(f"hash workers: {app.config['PASSWORD_HASH_WORKERS']}")
+    print(f"{'iterations':>10} {'threads':>7} {'req/s':>8} {'ms/user':>8}")
+    for iterations in args.iterations:
+        password_hasher.iterations = iterations
+        for threads in args.threads:
+            seconds, failures = create_users(args.users, threads, f'u{iterations}t{threads}')
+            if failures:
+                print(f'  {len(failures)} requests failed: {sorted(set(failures))}')
+            print(f'{iterations:>10} {threads:>7} {args.users / seconds:8.1f} '
+                  f'{seconds * 1000 / args.users:8.1f}')
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
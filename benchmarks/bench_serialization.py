@@ -0,0 +1,103 @@
+"""
+Compare the ways GET /character can turn rows into JSON.
+
+    python benchmarks/bench_serialization.py --characters 20000 --repeat 5
+
+Seeds a throwaway SQLite database and times, for the whole table:
+lazy ORM + serialize() (the original path), eager ORM + serialize(),
+Row tuples + serialize_row(), each encoded with the stdlib and with orjson.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'bench_serialization.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from sqlalchemy import insert  # noqa: E402
+from app import app  # noqa: E402
+from models import db, Character, Planet, Vehicle  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def seed(characters):
+    db.drop_all()
+    db.create_all()
+    planets = max(1, characters // 20)
+    db.session.execute(insert(Planet), [
+        {'name': f'planet-{i}', 'climate': 'arid'} for i in range(planets)])
+    db.session.execute(insert(Vehicle), [
+        {'name': f'vehicle-{i}', 'model': f'model-{i}', 'manufacturer': f'maker-{i}'}
+        for i in range(planets)])
+    db.session.execute(insert(Character), [
+        {'name': f'character-{i}', 'gender': 'n/a', 'birth_year': '19BBY',
+         'homeplanet_id': i % planets + 1, 'vehicle_id': i % planets + 1}
+        for i in range(characters)])
+    db.session.commit()
+
+
+def lazy_orm():
+    return [character.serialize() for character in Character.query.order_by(Character.id)]
+
+
+def eager_orm():
+    return [character.serialize()
+            for character in Character.eager_query().order_by(Character.id)]
+
+
+def rows():
+    return [Character.serialize_row(row)
+            for row in Character.row_query().order_by(Character.id)]
+
+
+def stdlib_dumps(data):
+    return json.dumps(data)
+
+
+def orjson_dumps(data):
+    return orjson.dumps(data)
+
+
+def timed(build, encode, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        encode(build())
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--characters', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    encoders = [('stdlib', stdlib_dumps)]
+    if orjson is not None:
+        encoders.append(('orjson', orjson_dumps))
+
+    with app.app_context():
+        seed(args.characters)
+        print(f'{args.characters} characters, best of {args.repeat}')
+        baseline = None
+        for build_name, build in [('lazy ORM', lazy_orm), ('eager ORM', eager_orm), ('rows', rows)]:
+            for encode_name, encode in encoders:
+                seconds = timed(build, encode, args.repeat)
+                baseline = baseline or seconds
+                print(f'  {build_name:10} + {encode_name:6} {seconds * 1000:9.1f} ms'
+                      f'  x{baseline / seconds:.1f}')
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Compare gunicorn's sync workers with uvicorn + asgi.py on I/O-bound reads.
+
+    python benchmarks/compare_servers.py --latency-ms 5 --concurrency 16
+
+Seeds a throwaway SQLite database once, then for each server starts it on
+slow_db.py (every statement takes --latency-ms longer, standing in for the
+network round trip to a real database server), replays the GET scenarios
+of load.py against it over HTTP, and prints throughput and latency side
+by side. Every server gets the same number of worker processes.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOAD = os.path.join(HERE, 'load.py')
+
+
+def servers(workers, threads):
+    python = sys.executable
+    return {
+        'gunicorn sync': [python, '-m', 'gunicorn', '--chdir', HERE, '-w', str(workers),
+                          '-b', '127.0.0.1:{port}', 'slow_db:wsgi_application'],
+        f'gunicorn gthread x{threads}': [
+            python, '-m', 'gunicorn', '--chdir', HERE, '-w', str(workers), '-k', 'gthread',
+            '--threads', str(threads), '-b', '127.0.0.1:{port}', 'slow_db:wsgi_application'],
+        f'uvicorn + asgi.py x{threads}': [
+            python, '-m', 'uvicorn', 'slow_db:asgi_application', '--app-dir', HERE,
+            '--workers', str(workers), '--port', '{port}', '--log-level', 'warning'],
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with status {process.returncode}')
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not answer on {url}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=10,
+                        help='ASGI_THREADS for uvicorn, --threads for gthread')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='compare_servers')
+    database_url = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    env = {**os.environ, 'DATABASE_URL': database_url, 'INTERNAL_TOKEN': 'load-bench',
+           'BENCH_DB_LATENCY_MS': str(args.latency_ms), 'ASGI_THREADS': str(args.threads),
+           # one connection per thread, so nothing queues on the pool
+           'DB_POOL_SIZE': str(args.threads), 'DB_MAX_OVERFLOW': '0'}
+    subprocess.run([sys.executable, LOAD, '--database-url', database_url, '--requests', '0'],
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+
+    print(f'{args.requests} GET requests, {args.concurrency} clients, {args.workers} workers, '
+          f'+{args.latency_ms:g} ms per statement')
+    print(f"{'server':28} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for name, command in servers(args.workers, args.threads).items():
+        port = free_port()
+        process = subprocess.Popen([part.format(port=port) for part in command], env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        output = os.path.join(workdir, 'result.json')
+        try:
+            wait_until_up(f'http://127.0.0.1:{port}/', process)
+            subprocess.run([sys.executable, LOAD, '--database-url', database_url, '--no-seed-db',
+                            '--url', f'http://127.0.0.1:{port}', '--only', '^GET ',
+                            '--concurrency', str(args.concurrency),
+                            '--requests', str(args.requests), '--output', output],
+                           env=env, check=True, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+        finally:
+            process.terminate()
+            process.wait()
+        with open(output) as source:
+            result = json.load(source)
+
+        endpoints = result['endpoints'].values()
+        count = sum(stats['count'] for stats in endpoints)
+        # request-weighted across endpoints
+        p50 = sum(stats['p50_ms'] * stats['count'] for stats in endpoints) / count
+        p95 = sum(stats['p95_ms'] * stats['count'] for stats in endpoints) / count
+        errors = sum(stats['errors'] for stats in endpoints)
+        print(f"{name:28} {result['throughput_rps']:8.1f} {p50:8.2f} {p95:8.2f} {errors:7}")
+
+
+if __name__ == '__main__':
+    main()
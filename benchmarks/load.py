@@ -0,0 +1,435 @@
+"""
+Seed a database and replay a weighted request mix against every API route.
+
+    python benchmarks/load.py --requests 5000 --output benchmarks/results.json
+    python benchmarks/load.py --requests 5000 --baseline benchmarks/results.json
+    python benchmarks/load.py --url http://127.0.0.1:3000 --concurrency 16
+
+The database is a throwaway SQLite file in the temp directory unless
+--database-url or BENCH_DATABASE_URL names another one; DATABASE_URL is
+ignored so a .env pointing at the development database is never touched.
+Seeding drops and recreates every table, so it refuses to run against a
+database outside the temp directory without --reset (or reuse the data
+with --no-seed-db).
+
+Without --url the app runs in-process through Flask's test client. With
+--url the requests go over HTTP to a running server (gunicorn, uvicorn...)
+that must use the same database this script seeds. Query counts are read
+from the Server-Timing header, so they are reported in both modes.
+
+Results are written as JSON; --baseline compares a run against a stored
+one and exits with status 1 when an endpoint's p95 latency or query count
+regressed.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+DEFAULT_DB = os.path.join(tempfile.gettempdir(), 'bench_load.db')
+
+
+def _database_url():
+    # the app reads DATABASE_URL at import time, before main() parses args
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--database-url')
+    known, _ = parser.parse_known_args()
+    return (known.database_url or os.environ.get('BENCH_DATABASE_URL')
+            or 'sqlite:///' + DEFAULT_DB)
+
+
+DATABASE_URL = os.environ['DATABASE_URL'] = _database_url()
+# /metrics and /internal/* answer 404 without it; a --url server needs the same value
+INTERNAL_TOKEN = os.environ.setdefault('INTERNAL_TOKEN', 'load-bench')
+AUTH_HEADERS = {'Authorization': f'Bearer {INTERNAL_TOKEN}'}
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from sqlalchemy import insert  # noqa: E402
+from app import app  # noqa: E402
+from models import db, User, Character, Planet, Vehicle, Favorites  # noqa: E402
+from stats import reconcile  # noqa: E402
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+KINDS = ('character', 'planet', 'vehicle')
+# routes that are not part of the API surface
+SKIPPED_ROUTES = ('/static/', '/admin', '/swagger.json')
+
+
+class State:
+    """Ids the mix draws from, plus rows created during the run that the
+    DELETE scenarios are allowed to remove."""
+
+    def __init__(self, args, rng):
+        self.rng = rng
+        self.counts = {
+            'user': args.users,
+            'character': args.characters,
+            'planet': args.planets,
+            'vehicle': args.vehicles,
+        }
+        self.created = {kind: [] for kind in ('user',) + KINDS}
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def pick(self, kind):
+        return self.rng.randint(1, self.counts[kind])
+
+    def unique(self, prefix):
+        with self.lock:
+            self.sequence += 1
+            return f'{prefix}-{os.getpid()}-{self.sequence}'
+
+    def take_created(self, kind):
+        with self.lock:
+            return self.created[kind].pop() if self.created[kind] else None
+
+
+def is_throwaway(url):
+    """True for SQLite databases in memory or under the temp directory."""
+    if not url.startswith('sqlite://'):
+        return False
+    path = url.split(':///', 1)[1] if ':///' in url else ''
+    if path in ('', ':memory:'):
+        return True
+    tmp = os.path.realpath(tempfile.gettempdir())
+    return os.path.realpath(path).startswith(tmp + os.sep)
+
+
+def seed(args, rng):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(insert(User), [
+        {'email': f'user{i}@example.com', 'username': f'user{i}', 'password': 'secret',
+         'is_active': True} for i in range(args.users)])
+    db.session.execute(insert(Planet), [
+        {'name': f'Planet {i}', 'climate': rng.choice(['arid', 'temperate', 'frozen'])}
+        for i in range(args.planets)])
+    db.session.execute(insert(Vehicle), [
+        {'name': f'Vehicle {i}', 'model': f'Model {i}', 'manufacturer': f'Maker {i}'}
+        for i in range(args.vehicles)])
+    db.session.execute(insert(Character), [
+        {'name': f'Character {i}', 'gender': rng.choice(['male', 'female', 'n/a']),
+         'birth_year': f'{rng.randint(1, 900)}BBY',
+         'homeplanet_id': rng.randint(1, args.planets),
+         'vehicle_id': rng.randint(1, args.vehicles)} for i in range(args.characters)])
+
+    totals = {'character': args.characters, 'planet': args.planets, 'vehicle': args.vehicles}
+    favorites = set()
+    while len(favorites) < args.favorites:
+        kind = rng.choice(KINDS)
+        favorites.add((rng.randint(1, args.users), kind, rng.randint(1, totals[kind])))
+    db.session.execute(insert(Favorites), [
+        {'user_id': user_id, 'character_id': None, 'planet_id': None, 'vehicle_id': None,
+         f'{kind}_id': entity_id} for user_id, kind, entity_id in favorites])
+    db.session.commit()
+    # the seed bypasses the favorites write path, so fill the counters in one go
+    reconcile()
+
+
+def _create(kind, state):
+    if kind == 'user':
+        name = state.unique('bench')
+        return 'POST', '/user', {'email': f'{name}@example.com', 'username': name,
+                                 'password': 'secret'}
+    body = {'name': state.unique(kind)}
+    if kind == 'vehicle':
+        body.update(model=state.unique('model'), manufacturer=state.unique('maker'))
+    return 'POST', f'/{kind}', body
+
+
+def _delete(kind, state):
+    entity_id = state.take_created(kind)
+    if entity_id is None:
+        return _create(kind, state)
+    return 'DELETE', f'/{kind}/{entity_id}', None
+
+
+def _bulk(kind, state):
+    return 'POST', f'/{kind}/bulk', [_create(kind, state)[2] for _ in range(20)]
+
+
+def _favorite(method, kind):
+    def build(state):
+        return method, f'/user/{state.pick("user")}/favorites/{kind}/{state.pick(kind)}', None
+    return build
+
+
+def _batch(state):
+    items = [{'type': kind, 'id': state.pick(kind)} for kind in state.rng.choices(KINDS, k=25)]
+    action = state.rng.choice(['check', 'check', 'add', 'remove'])
+    return 'POST', f'/user/{state.pick("user")}/favorites/batch', {'action': action, 'items': items}
+
+
+# label -> (weight, request builder); labels are "METHOD rule" so they can be
+# checked against app.url_map
+MIX = {
+    'GET /': (1, lambda s: ('GET', '/', None)),
+    'GET /metrics': (1, lambda s: ('GET', '/metrics', None)),
+    'GET /internal/pool': (1, lambda s: ('GET', '/internal/pool', None)),
+    'GET /internal/cache': (1, lambda s: ('GET', '/internal/cache', None)),
+    'GET /search': (30, lambda s: ('GET', '/search?q=' + quote(s.rng.choice(
+        ['char', 'planet 1', 'veh', 'maker 2', 'model'])), None)),
+    'GET /stats': (5, lambda s: ('GET', '/stats', None)),
+    'GET /user': (10, lambda s: ('GET', '/user', None)),
+    'POST /user': (3, lambda s: _create('user', s)),
+    'DELETE /user/<int:user_id>': (1, lambda s: _delete('user', s)),
+    'POST /login': (2, lambda s: ('POST', '/login', {
+        'username': f'user{s.pick("user") - 1}', 'password': 'secret'})),
+    'GET /character': (60, lambda s: ('GET', s.rng.choice(
+        ['/character', '/character?limit=200', '/character?fields=id,name&sort=name',
+         '/character?gender=female']), None)),
+    'POST /character': (3, lambda s: _create('character', s)),
+    'POST /character/bulk': (1, lambda s: _bulk('character', s)),
+    'GET /character/<int:character_id>': (80, lambda s: ('GET', f'/character/{s.pick("character")}', None)),
+    'DELETE /character/<int:character_id>': (1, lambda s: _delete('character', s)),
+    'GET /planet': (30, lambda s: ('GET', s.rng.choice(
+        ['/planet', '/planet?include=characters']), None)),
+    'POST /planet': (2, lambda s: _create('planet', s)),
+    'POST /planet/bulk': (1, lambda s: _bulk('planet', s)),
+    'GET /planet/<int:planet_id>': (50, lambda s: ('GET', f'/planet/{s.pick("planet")}', None)),
+    'DELETE /planet/<int:planet_id>': (1, lambda s: _delete('planet', s)),
+    'GET /planet/<int:planet_id>/characters': (20, lambda s: (
+        'GET', f'/planet/{s.pick("planet")}/characters', None)),
+    'GET /vehicle': (30, lambda s: ('GET', s.rng.choice(
+        ['/vehicle', '/vehicle?include=characters']), None)),
+    'POST /vehicle': (2, lambda s: _create('vehicle', s)),
+    'POST /vehicle/bulk': (1, lambda s: _bulk('vehicle', s)),
+    'GET /vehicle/<int:vehicle_id>': (50, lambda s: ('GET', f'/vehicle/{s.pick("vehicle")}', None)),
+    'DELETE /vehicle/<int:vehicle_id>': (1, lambda s: _delete('vehicle', s)),
+    'GET /vehicle/<int:vehicle_id>/characters': (20, lambda s: (
+        'GET', f'/vehicle/{s.pick("vehicle")}/characters', None)),
+    'GET /user/<int:user_id>/favorites': (40, lambda s: ('GET', s.rng.choice(
+        [f'/user/{s.pick("user")}/favorites', f'/user/{s.pick("user")}/favorites?expand=true']), None)),
+    'POST /user/<int:user_id>/favorites/batch': (10, _batch),
+}
+for _kind in KINDS:
+    _rule = f'/user/<int:user_id>/favorites/{_kind}/<int:{_kind}_id>'
+    MIX[f'GET {_rule}'] = (20, _favorite('GET', _kind))
+    MIX[f'POST {_rule}'] = (10, _favorite('POST', _kind))
+    MIX[f'DELETE {_rule}'] = (10, _favorite('DELETE', _kind))
+
+
+def uncovered_routes():
+    routes = set()
+    for rule in app.url_map.iter_rules():
+        if rule.rule.startswith(SKIPPED_ROUTES):
+            continue
+        for method in rule.methods - {'HEAD', 'OPTIONS'}:
+            routes.add(f'{method} {rule.rule}')
+    return sorted(routes - set(MIX))
+
+
+class InProcessClient:
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body, headers=AUTH_HEADERS)
+        return response.status_code, response.headers.get('Server-Timing', ''), response.get_data()
+
+
+class HTTPClient:
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.local = threading.local()
+
+    def request(self, method, path, body):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection(self.host, self.port)
+        payload = json.dumps(body) if body is not None else None
+        headers = dict(AUTH_HEADERS)
+        if payload is not None:
+            headers['Content-Type'] = 'application/json'
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.getheader('Server-Timing', ''), response.read()
+        except (OSError, http.client.HTTPException):
+            # count it as a failed request and reconnect, rather than losing
+            # this client thread for the rest of the run
+            connection.close()
+            self.local.connection = None
+            return 599, '', b''
+
+
+def record_created(state, label, method, path, status, data):
+    if method != 'POST' or status != 201 or path.count('/') != 1:
+        return
+    kind = path.strip('/')
+    try:
+        entity_id = json.loads(data)['id']
+    except (ValueError, KeyError, TypeError):
+        return
+    with state.lock:
+        state.created[kind].append(entity_id)
+
+
+def run(client, state, plan, concurrency):
+    samples = {label: [] for label in MIX}
+    position = iter(range(len(plan)))
+    position_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with position_lock:
+                index = next(position, None)
+            if index is None:
+                return
+            label = plan[index]
+            method, path, body = MIX[label][1](state)
+            start = time.perf_counter()
+            status, timing, data = client.request(method, path, body)
+            elapsed = time.perf_counter() - start
+            match = QUERIES_RE.search(timing)
+            samples[label].append((elapsed, int(match.group(1)) if match else None, status))
+            record_created(state, label, method, path, status, data)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, wall_seconds):
+    endpoints = {}
+    for label, values in samples.items():
+        if not values:
+            continue
+        latencies = sorted(value[0] for value in values)
+        queries = [value[1] for value in values if value[1] is not None]
+        endpoints[label] = {
+            'count': len(values),
+            'errors': sum(1 for value in values if value[2] >= 500),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'mean_queries': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    total = sum(len(values) for values in samples.values())
+    return {
+        'total_requests': total,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_rps': round(total / wall_seconds, 1) if wall_seconds else None,
+        'endpoints': endpoints,
+    }
+
+
+def compare(result, baseline, threshold, noise_ms):
+    regressions = []
+    for label, current in result['endpoints'].items():
+        previous = baseline['endpoints'].get(label)
+        if not previous:
+            continue
+        if (current['p95_ms'] > previous['p95_ms'] * (1 + threshold)
+                and current['p95_ms'] - previous['p95_ms'] > noise_ms):
+            regressions.append(f"{label}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if (current['mean_queries'] is not None and previous['mean_queries'] is not None
+                and current['mean_queries'] > previous['mean_queries'] + 0.5):
+            regressions.append(
+                f"{label}: queries {previous['mean_queries']} -> {current['mean_queries']}")
+    return regressions
+
+
+def print_report(result):
+    print(f"{result['total_requests']} requests in {result['wall_seconds']} s "
+          f"({result['throughput_rps']} req/s)")
+    print(f"{'endpoint':66} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}")
+    for label, stats in sorted(result['endpoints'].items()):
+        queries = '-' if stats['mean_queries'] is None else stats['mean_queries']
+        print(f"{label:66} {stats['count']:6} {stats['p50_ms']:8.2f} {stats['p95_ms']:8.2f} "
+              f"{stats['p99_ms']:8.2f} {queries:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--characters', type=int, default=2000)
+    parser.add_argument('--planets', type=int, default=200)
+    parser.add_argument('--vehicles', type=int, default=200)
+    parser.add_argument('--favorites', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='client threads; only meaningful with --url')
+    parser.add_argument('--url', help='benchmark a running server instead of the app in-process')
+    parser.add_argument('--database-url',
+                        help='database to seed and benchmark (default: BENCH_DATABASE_URL, '
+                             'else a SQLite file in the temp directory)')
+    parser.add_argument('--reset', action='store_true',
+                        help='allow seeding, i.e. dropping every table of, a database '
+                             'outside the temp directory')
+    parser.add_argument('--only', help='only run scenarios whose label matches this regex, '
+                                       'e.g. "^GET" for reads')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-seed-db', action='store_true', help='reuse the existing data')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed relative p95 slowdown before flagging')
+    parser.add_argument('--noise-ms', type=float, default=1.0,
+                        help='ignore p95 differences smaller than this')
+    args = parser.parse_args()
+
+    if not args.no_seed_db and not args.reset and not is_throwaway(DATABASE_URL):
+        parser.error(f'{DATABASE_URL} is not a temporary database; seeding drops every '
+                     'table, pass --reset to do it anyway or --no-seed-db to reuse the data')
+
+    missing = uncovered_routes()
+    if missing:
+        print('warning: no scenario for ' + ', '.join(missing), file=sys.stderr)
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        if not args.no_seed_db:
+            seed(args, rng)
+        state = State(args, rng)
+        labels = [label for label in MIX if not args.only or re.search(args.only, label)]
+        plan = rng.choices(labels, weights=[MIX[label][0] for label in labels], k=args.requests)
+
+        if args.url:
+            client, concurrency = HTTPClient(args.url), args.concurrency
+        else:
+            client, concurrency = InProcessClient(), 1
+        samples, wall_seconds = run(client, state, plan, concurrency)
+
+    result = summarize(samples, wall_seconds)
+    result['meta'] = {key: value for key, value in vars(args).items()
+                      if key not in ('output', 'baseline')}
+    result['meta']['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    print_report(result)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(result, output, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as source:
+            regressions = compare(result, json.load(source), args.threshold, args.noise_ms)
+        if regressions:
+            print('\nregressions against ' + args.baseline + ':')
+            for line in regressions:
+                print('  ' + line)
+            sys.exit(1)
+        print('\nno regressions against ' + args.baseline)
+
+
+if __name__ == '__main__':
+    main()
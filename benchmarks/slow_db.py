@@ -0,0 +1,29 @@
+"""
+The app with a fixed delay added to every database round trip, to compare
+servers on I/O-bound requests without a remote database at hand:
+
+    BENCH_DB_LATENCY_MS=5 gunicorn --chdir benchmarks -w 2 slow_db:wsgi_application
+    BENCH_DB_LATENCY_MS=5 uvicorn slow_db:asgi_application --app-dir benchmarks --workers 2
+
+The delay is a time.sleep() before each statement, which releases the GIL
+like waiting on a socket does. See compare_servers.py.
+"""
+import os
+import sys
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+LATENCY = float(os.getenv('BENCH_DB_LATENCY_MS', 5)) / 1000
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _round_trip(conn, cursor, statement, parameters, context, executemany):
+    time.sleep(LATENCY)
+
+
+from wsgi import application as wsgi_application  # noqa: E402
+from asgi import application as asgi_application  # noqa: E402
@@ -0,0 +1,52 @@
+"""cascade favorites and null character references on entity delete
+
+Revision ID: 354257f122cc
+Revises: b495e580e2ae
+Create Date: 2026-10-17 12:04:41.220517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '354257f122cc'
+down_revision = 'b495e580e2ae'
+branch_labels = None
+depends_on = None
+
+naming_convention = {
+    "fk": "%(table_name)s_%(column_0_name)s_fkey",
+}
+
+# table -> [(column, referred table, ON DELETE action)]
+FOREIGN_KEYS = {
+    'favorites': [
+        ('character_id', 'characters', 'CASCADE'),
+        ('planet_id', 'planets', 'CASCADE'),
+        ('vehicle_id', 'vehicles', 'CASCADE'),
+    ],
+    'characters': [
+        ('homeplanet_id', 'planets', 'SET NULL'),
+        ('vehicle_id', 'vehicles', 'SET NULL'),
+    ],
+}
+
+
+def _recreate_foreign_keys(with_ondelete):
+    for table, keys in FOREIGN_KEYS.items():
+        with op.batch_alter_table(table, naming_convention=naming_convention) as batch_op:
+            for column, referred, ondelete in keys:
+                name = f'{table}_{column}_fkey'
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(
+                    name, referred, [column], ['id'],
+                    ondelete=ondelete if with_ondelete else None)
+
+
+def upgrade():
+    _recreate_foreign_keys(with_ondelete=True)
+
+
+def downgrade():
+    _recreate_foreign_keys(with_ondelete=False)
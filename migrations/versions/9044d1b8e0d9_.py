@@ -0,0 +1,34 @@
+"""index favorites and characters foreign keys
+
+Revision ID: 9044d1b8e0d9
+Revises: c30f56eebeba
+Create Date: 2026-10-17 10:03:18.227460
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9044d1b8e0d9'
+down_revision = 'c30f56eebeba'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # favorites.user_id is already the leading column of the unique_user_*
+    # constraints, so only the other foreign keys need their own index
+    op.create_index(op.f('ix_favorites_character_id'), 'favorites', ['character_id'], unique=False)
+    op.create_index(op.f('ix_favorites_planet_id'), 'favorites', ['planet_id'], unique=False)
+    op.create_index(op.f('ix_favorites_vehicle_id'), 'favorites', ['vehicle_id'], unique=False)
+    op.create_index(op.f('ix_characters_homeplanet_id'), 'characters', ['homeplanet_id'], unique=False)
+    op.create_index(op.f('ix_characters_vehicle_id'), 'characters', ['vehicle_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_characters_vehicle_id'), table_name='characters')
+    op.drop_index(op.f('ix_characters_homeplanet_id'), table_name='characters')
+    op.drop_index(op.f('ix_favorites_vehicle_id'), table_name='favorites')
+    op.drop_index(op.f('ix_favorites_planet_id'), table_name='favorites')
+    op.drop_index(op.f('ix_favorites_character_id'), table_name='favorites')
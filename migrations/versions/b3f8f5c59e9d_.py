@@ -0,0 +1,45 @@
+"""add favorite_counts for the stats endpoint
+
+Revision ID: b3f8f5c59e9d
+Revises: 354257f122cc
+Create Date: 2026-10-17 13:21:07.642380
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f8f5c59e9d'
+down_revision = '354257f122cc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    favorite_counts = op.create_table('favorite_counts',
+    sa.Column('subject', sa.String(length=20), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('subject', 'subject_id')
+    )
+    op.create_index('ix_favorite_counts_subject_count', 'favorite_counts',
+                    ['subject', 'count', 'subject_id'], unique=False)
+
+    # start from the favorites that already exist
+    favorites = sa.table('favorites',
+        sa.column('user_id'), sa.column('character_id'),
+        sa.column('planet_id'), sa.column('vehicle_id'))
+    for subject, column in (('user', 'user_id'), ('character', 'character_id'),
+                            ('planet', 'planet_id'), ('vehicle', 'vehicle_id')):
+        column = favorites.c[column]
+        op.execute(favorite_counts.insert().from_select(
+            ['subject', 'subject_id', 'count'],
+            sa.select(sa.literal(subject), column, sa.func.count())
+            .where(column.isnot(None))
+            .group_by(column)))
+
+
+def downgrade():
+    op.drop_index('ix_favorite_counts_subject_count', table_name='favorite_counts')
+    op.drop_table('favorite_counts')
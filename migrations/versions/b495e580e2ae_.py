@@ -0,0 +1,36 @@
+"""cascade favorites on user delete
+
+Revision ID: b495e580e2ae
+Revises: 9044d1b8e0d9
+Create Date: 2026-10-17 11:26:05.918342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b495e580e2ae'
+down_revision = '9044d1b8e0d9'
+branch_labels = None
+depends_on = None
+
+# the foreign keys were created unnamed; this matches Postgres' default names
+# and lets batch mode find them again when SQLite rebuilds the table
+naming_convention = {
+    "fk": "%(table_name)s_%(column_0_name)s_fkey",
+}
+
+
+def upgrade():
+    with op.batch_alter_table('favorites', naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint('favorites_user_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key(
+            'favorites_user_id_fkey', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    with op.batch_alter_table('favorites', naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint('favorites_user_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key(
+            'favorites_user_id_fkey', 'users', ['user_id'], ['id'])
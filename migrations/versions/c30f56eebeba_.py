@@ -0,0 +1,32 @@
+"""add table_versions for ETag tracking
+
+Revision ID: c30f56eebeba
+Revises: 118d5a03f156
+Create Date: 2026-10-17 09:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c30f56eebeba'
+down_revision = '118d5a03f156'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_versions = op.create_table('table_versions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_versions, [
+        {'name': name, 'version': 0}
+        for name in ('users', 'characters', 'planets', 'vehicles')
+    ])
+
+
+def downgrade():
+    op.drop_table('table_versions')
@@ -2,17 +2,33 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
+from functools import partial
 from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
+from sqlalchemy.exc import IntegrityError
+from utils import (APIException, generate_sitemap, paginate, page_response, wants_stream,
+                   stream_response, conditional_get, bulk_create, delete_by_id, field_error,
+                   internal_only)
+from cache import entity_cache
+from lazy_extensions import init_migrate, register_swagger
+from db_pool import engine_options_from_env, pool_stats
+from replicas import replica_router, read_primary
+from explain import register_commands
+from listing import list_query, requested_includes, embed_related
+from json_provider import init_json_provider
+from metrics import metrics
+from passwords import password_hasher
+from search import search_index, SOURCES as SEARCH_SOURCES
+from write_behind import favorite_queue
+from stats import summary as stats_summary, forget as forget_stats, register_stats_commands
+from favorites import (batch_favorites, user_favorites, add_favorite, remove_favorite,
+                       favorite_status, write_queued_favorites)
 from models import db, User, Character, Planet, Vehicle, Favorites
 
 
 app = Flask(__name__)
 app.url_map.strict_slashes = False
+init_json_provider(app)
 
 db_url = os.getenv("DATABASE_URL")
 if db_url is not None:
@@ -21,9 +37,31 @@ if db_url is not None:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-MIGRATE = Migrate(app, db)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_from_env(
+    app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['DATABASE_REPLICA_URLS'] = os.getenv("DATABASE_REPLICA_URLS")
+app.config['API_ONLY'] = os.getenv("API_ONLY", "0").lower() in ("1", "true")
+app.config['REPLICA_RETRY_SECONDS'] = int(os.getenv("REPLICA_RETRY_SECONDS", 30))
+app.config['CACHE_URL'] = os.getenv("CACHE_URL")
+app.config['INTERNAL_TOKEN'] = os.getenv("INTERNAL_TOKEN")
+app.config['CACHE_MAXSIZE'] = int(os.getenv("CACHE_MAXSIZE", 1024))
+app.config['CACHE_TTL'] = int(os.getenv("CACHE_TTL", 300))
+app.config['QUERY_COUNT_WARNING'] = int(os.getenv("QUERY_COUNT_WARNING", 20))
+app.config['PASSWORD_HASH_ITERATIONS'] = int(os.getenv("PASSWORD_HASH_ITERATIONS", 600000))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+app.config['FAVORITES_WRITE_BEHIND'] = os.getenv("FAVORITES_WRITE_BEHIND", "0").lower() in ("1", "true")
+app.config['FAVORITES_FLUSH_INTERVAL'] = float(os.getenv("FAVORITES_FLUSH_INTERVAL", 0.1))
+app.config['FAVORITES_FLUSH_SIZE'] = int(os.getenv("FAVORITES_FLUSH_SIZE", 500))
+
+init_migrate(app, db)
 db.init_app(app)
+replica_router.init_app(app, db)
+entity_cache.init_app(app)
+metrics.init_app(app)
+password_hasher.init_app(app)
+favorite_queue.init_app(app, write_queued_favorites)
+register_commands(app)
+register_stats_commands(app)
 CORS(app)
 
 
@@ -40,13 +78,69 @@ def sitemap():
     return generate_sitemap(app)
 
 
+def handle_bulk_create(model, fields, unique):
+    data = request.get_json(silent=True)
+    if not isinstance(data, list) or not data:
+        return jsonify({'msg': 'Expected a non-empty JSON array'}), 400
+
+    results = bulk_create(model, data, fields, unique)
+    created = sum(1 for result in results if result['status'] == 'created')
+    return jsonify({'created': created, 'results': results}), 201 if created else 200
+
+
+@app.route('/internal/pool', methods=['GET'])
+@internal_only
+def handle_pool_stats():
+    stats = pool_stats(db.engine)
+    if replica_router.enabled:
+        stats['replicas'] = replica_router.stats()
+    return jsonify(stats), 200
+
+
+@app.route('/internal/cache', methods=['GET'])
+@internal_only
+def handle_cache_stats():
+    return jsonify(entity_cache.stats()), 200
+
+
+@app.route('/search', methods=['GET'])
+def handle_search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'msg': 'Query parameter q is required'}), 400
+
+    kinds = {kind for kind, _, _ in SEARCH_SOURCES.values()}
+    types = None
+    if request.args.get('type'):
+        types = set(request.args['type'].split(','))
+        if not types <= kinds:
+            return jsonify({'msg': 'type must be one of: ' + ', '.join(sorted(kinds))}), 400
+
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    return jsonify({'results': search_index.search(query, types, limit)}), 200
+
+
+@app.route('/stats', methods=['GET'])
+def handle_stats():
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    return jsonify(stats_summary(limit)), 200
+
+
 @app.route('/user', methods=['GET', 'POST'])
 def handle_users():
 
     if request.method == 'GET':
 
-        all_users = User.query.all()
-        return jsonify([user.serialize() for user in all_users]), 200
+        query, order, serialize = list_query(
+            User,
+            fields=('id', 'email', 'username', 'is_active'),
+            filterable=('email', 'username', 'is_active'),
+            sortable=('id', 'username', 'email'))
+        if wants_stream():
+            return stream_response(query, User, order, serialize)
+
+        users, next_url = paginate(query, User, order)
+        return page_response([serialize(user) for user in users], next_url), 200
 
     elif request.method == 'POST':
         data = request.get_json(silent=True)
@@ -55,6 +149,8 @@ def handle_users():
 
         if not data.get('email') or not data.get('username') or not data.get('password'):
             return jsonify({'msg': 'Email, username, and password are required'}), 400
+        if not isinstance(data.get('password'), str):
+            return jsonify({'msg': 'password must be a string'}), 400
 
         existing_user = User.query.filter(
             (User.email == data.get('email')) |
@@ -67,7 +163,7 @@ def handle_users():
         new_user = User(
             email=data.get('email'),
             username=data.get('username'),
-            password=data.get('password'),
+            password=password_hasher.hash(data.get('password')),
             is_active=data.get('is_active', True)
         )
 
@@ -77,25 +173,82 @@ def handle_users():
         return jsonify(new_user.serialize()), 201
 
 
-@app.route('/user/<int:user_id>', methods=['DELETE'])
-def delete_user(user_id):
-    user = User.query.get(user_id)
+@app.route('/login', methods=['POST'])
+def login():
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'msg': 'Check JSON body'}), 400
 
+    if not data.get('password') or not (data.get('email') or data.get('username')):
+        return jsonify({'msg': 'Email or username, and password are required'}), 400
+    if not isinstance(data.get('password'), str):
+        return jsonify({'msg': 'password must be a string'}), 400
+
+    user = User.query.filter(
+        (User.email == data.get('email')) |
+        (User.username == data.get('username'))
+    ).first()
     if not user:
-        return jsonify({'msg': 'User not found'}), 404
+        return jsonify({'msg': 'Invalid credentials'}), 401
+
+    matches, needs_rehash = password_hasher.verify(data.get('password'), user.password)
+    if not matches:
+        return jsonify({'msg': 'Invalid credentials'}), 401
+
+    if needs_rehash:
+        # stored with an older work factor (or in plain text): upgrade it now
+        # that we have the password
+        user.password = password_hasher.hash(data.get('password'))
+        db.session.commit()
+
+    return jsonify(user.serialize()), 200
 
-    db.session.delete(user)
-    db.session.commit()
+
+@app.route('/user/<int:user_id>', methods=['DELETE'])
+def delete_user(user_id):
+    # favorites go with it through ON DELETE CASCADE, so no rows are loaded
+    forget_stats('user', user_id)
+    if not delete_by_id(User, user_id):
+        return jsonify({'msg': 'User not found'}), 404
 
     return jsonify({'msg': 'User deleted successfully'}), 200
 
 
+# what planets and vehicles embed for each of their characters
+CHARACTER_SUMMARY_FIELDS = ('id', 'name', 'gender', 'birth_year')
+
+
+def list_characters(*criteria):
+    query, order, serialize = list_query(
+        Character,
+        fields=('id', 'name', 'gender', 'birth_year', 'homeplanet_id',
+                'homeplanet', 'vehicle_id', 'vehicle'),
+        filterable=('name', 'gender', 'birth_year', 'homeplanet_id', 'vehicle_id'),
+        embedded=('homeplanet', 'vehicle'),
+        full_query=Character.row_query(),
+        full_serialize=Character.serialize_row)
+    query = query.filter(*criteria)
+    if wants_stream():
+        return stream_response(query, Character, order, serialize)
+
+    characters, next_url = paginate(query, Character, order)
+    return page_response([serialize(character) for character in characters], next_url), 200
+
+
+def characters_expander(column):
+    # include=characters on the planet and vehicle lists
+    if 'characters' not in requested_includes(('characters',)):
+        return None
+    return partial(embed_related, key='characters', column=column,
+                   fields=CHARACTER_SUMMARY_FIELDS)
+
+
 @app.route('/character', methods=['GET', 'POST'])
+@conditional_get(Character, Planet, Vehicle)
 def handle_character():
 
     if request.method == 'GET':
-        all_characters = Character.query.all()
-        return jsonify([character.serialize() for character in all_characters]), 200
+        return list_characters()
 
     elif request.method == 'POST':
         data = request.get_json(silent=True)
@@ -106,47 +259,78 @@ def handle_character():
         if not data.get('name'):
             return jsonify({'msg': 'Name is required'}), 400
 
+        values = {field: data.get(field) for field in
+                  ('name', 'gender', 'birth_year', 'homeplanet_id', 'vehicle_id')}
+        error = field_error(Character, values)
+        if error:
+            return jsonify({'msg': error}), 400
+
         existing_character = Character.query.filter_by(
             name=data.get('name')).first()
         if existing_character:
             return jsonify({'msg': 'Character already exists'}), 400
 
-        new_character = Character(
-            name=data.get('name'),
-            gender=data.get('gender'),
-            birth_year=data.get('birth_year'),
-            homeplanet_id=data.get('homeplanet_id'),
-            vehicle_id=data.get('vehicle_id')
-        )
+        new_character = Character(**values)
 
         db.session.add(new_character)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # unknown homeplanet_id / vehicle_id, or the name was taken meanwhile
+            db.session.rollback()
+            for column, model in (('homeplanet_id', Planet), ('vehicle_id', Vehicle)):
+                if values[column] is not None and db.session.get(model, values[column]) is None:
+                    return jsonify({'msg': f'{model.__name__} not found'}), 400
+            return jsonify({'msg': 'Character already exists'}), 400
 
         return jsonify(new_character.serialize()), 201
 
 
-@app.route('/character/<int:character_id>', methods=['GET', 'DELETE'])
-def handle_single_character(character_id):
-    character = Character.query.get(character_id)
+@app.route('/character/bulk', methods=['POST'])
+def bulk_character():
+    return handle_bulk_create(
+        Character,
+        fields=('name', 'gender', 'birth_year', 'homeplanet_id', 'vehicle_id'),
+        unique=('name',))
 
-    if not character:
-        return jsonify({'msg': 'Character not found'}), 404
 
+@app.route('/character/<int:character_id>', methods=['GET', 'DELETE'])
+@conditional_get(Character, Planet, Vehicle)
+def handle_single_character(character_id):
     if request.method == 'GET':
-        return jsonify(character.serialize()), 200
+        character = entity_cache.fetch(
+            Character, character_id, Character.eager_query(), depends=(Planet, Vehicle))
+        if not character:
+            return jsonify({'msg': 'Character not found'}), 404
+
+        return jsonify(character), 200
 
     elif request.method == 'DELETE':
-        db.session.delete(character)
-        db.session.commit()
+        forget_stats('character', character_id)
+        if not delete_by_id(Character, character_id):
+            return jsonify({'msg': 'Character not found'}), 404
+
         return jsonify({'msg': 'Character deleted successfully'}), 200
 
 
 @app.route('/planet', methods=['GET', 'POST'])
+@conditional_get(Planet, Character)
 def handle_planet():
 
     if request.method == 'GET':
-        all_planets = Planet.query.all()
-        return jsonify([planet.serialize() for planet in all_planets]), 200
+        query, order, serialize = list_query(
+            Planet,
+            fields=('id', 'name', 'climate'),
+            filterable=('name', 'climate'))
+        expand = characters_expander(Character.homeplanet_id)
+        if wants_stream():
+            return stream_response(query, Planet, order, serialize, expand)
+
+        planets, next_url = paginate(query, Planet, order)
+        items = [serialize(planet) for planet in planets]
+        if expand is not None:
+            expand(items)
+        return page_response(items, next_url), 200
 
     elif request.method == 'POST':
         data = request.get_json(silent=True)
@@ -172,28 +356,60 @@ def handle_planet():
         return jsonify(new_planet.serialize()), 201
 
 
-@app.route('/planet/<int:planet_id>', methods=['GET', 'DELETE'])
-def handle_single_planet(planet_id):
-    planet = Planet.query.get(planet_id)
+@app.route('/planet/bulk', methods=['POST'])
+def bulk_planet():
+    return handle_bulk_create(
+        Planet,
+        fields=('name', 'climate'),
+        unique=('name',))
 
-    if not planet:
-        return jsonify({'msg': 'Planet not found'}), 404
 
+@app.route('/planet/<int:planet_id>', methods=['GET', 'DELETE'])
+@conditional_get(Planet)
+def handle_single_planet(planet_id):
     if request.method == 'GET':
-        return jsonify(planet.serialize()), 200
+        planet = entity_cache.fetch(Planet, planet_id)
+        if not planet:
+            return jsonify({'msg': 'Planet not found'}), 404
+
+        return jsonify(planet), 200
 
     elif request.method == 'DELETE':
-        db.session.delete(planet)
-        db.session.commit()
+        # the database cascades favorites and nulls characters.homeplanet_id
+        forget_stats('planet', planet_id)
+        if not delete_by_id(Planet, planet_id, touches={Character.__tablename__}):
+            return jsonify({'msg': 'Planet not found'}), 404
+
         return jsonify({'msg': 'Planet deleted successfully'}), 200
 
 
+@app.route('/planet/<int:planet_id>/characters', methods=['GET'])
+@conditional_get(Character, Planet, Vehicle)
+def get_planet_characters(planet_id):
+    if db.session.get(Planet, planet_id) is None:
+        return jsonify({'msg': 'Planet not found'}), 404
+
+    return list_characters(Character.homeplanet_id == planet_id)
+
+
 @app.route('/vehicle', methods=['GET', 'POST'])
+@conditional_get(Vehicle, Character)
 def handle_vehicle():
 
     if request.method == 'GET':
-        all_vehicles = Vehicle.query.all()
-        return jsonify([vehicle.serialize() for vehicle in all_vehicles]), 200
+        query, order, serialize = list_query(
+            Vehicle,
+            fields=('id', 'name', 'model', 'manufacturer'),
+            filterable=('name', 'model', 'manufacturer'))
+        expand = characters_expander(Character.vehicle_id)
+        if wants_stream():
+            return stream_response(query, Vehicle, order, serialize, expand)
+
+        vehicles, next_url = paginate(query, Vehicle, order)
+        items = [serialize(vehicle) for vehicle in vehicles]
+        if expand is not None:
+            expand(items)
+        return page_response(items, next_url), 200
 
     elif request.method == 'POST':
         data = request.get_json(silent=True)
@@ -221,204 +437,127 @@ def handle_vehicle():
         return jsonify(new_vehicle.serialize()), 201
 
 
-@app.route('/vehicle/<int:vehicle_id>', methods=['GET', 'DELETE'])
-def handle_single_vehicle(vehicle_id):
-    vehicle = Vehicle.query.get(vehicle_id)
+@app.route('/vehicle/bulk', methods=['POST'])
+def bulk_vehicle():
+    return handle_bulk_create(
+        Vehicle,
+        fields=('name', 'model', 'manufacturer'),
+        unique=('name', 'model', 'manufacturer'))
 
-    if not vehicle:
-        return jsonify({'msg': 'Vehicle not found'}), 404
 
+@app.route('/vehicle/<int:vehicle_id>', methods=['GET', 'DELETE'])
+@conditional_get(Vehicle)
+def handle_single_vehicle(vehicle_id):
     if request.method == 'GET':
-        return jsonify(vehicle.serialize()), 200
+        vehicle = entity_cache.fetch(Vehicle, vehicle_id)
+        if not vehicle:
+            return jsonify({'msg': 'Vehicle not found'}), 404
+
+        return jsonify(vehicle), 200
 
     elif request.method == 'DELETE':
-        db.session.delete(vehicle)
-        db.session.commit()
+        # the database cascades favorites and nulls characters.vehicle_id
+        forget_stats('vehicle', vehicle_id)
+        if not delete_by_id(Vehicle, vehicle_id, touches={Character.__tablename__}):
+            return jsonify({'msg': 'Vehicle not found'}), 404
+
         return jsonify({'msg': 'Vehicle deleted successfully'}), 200
 
 
+@app.route('/vehicle/<int:vehicle_id>/characters', methods=['GET'])
+@conditional_get(Character, Planet, Vehicle)
+def get_vehicle_characters(vehicle_id):
+    if db.session.get(Vehicle, vehicle_id) is None:
+        return jsonify({'msg': 'Vehicle not found'}), 404
+
+    return list_characters(Character.vehicle_id == vehicle_id)
+
+
 @app.route('/user/<int:user_id>/favorites', methods=['GET'])
+@read_primary
 def get_user_favorites(user_id):
-    user = User.query.get(user_id)
-
-    if not user:
+    if wants_stream():
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'msg': 'User not found'}), 404
+
+        if favorite_queue.overlay(user_id):
+            # the stream reads stored rows only, so write this user's toggles first
+            favorite_queue.flush()
+        return stream_response(Favorites.query.filter_by(user_id=user_id), Favorites)
+
+    expand = request.args.get('expand', '').lower() in ('1', 'true')
+    favorites = user_favorites(user_id, expand=expand)
+    if favorites is None:
         return jsonify({'msg': 'User not found'}), 404
 
-    favorites = Favorites.query.filter_by(user_id=user_id).all()
+    return jsonify(favorites), 200
 
-    return jsonify([favorite.serialize() for favorite in favorites]), 200
 
+@app.route('/user/<int:user_id>/favorites/batch', methods=['POST'])
+def handle_favorites_batch(user_id):
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data, dict):
+        return jsonify({'msg': 'Check JSON body'}), 400
 
-@app.route('/user/<int:user_id>/favorites/character/<int:character_id>', methods=['GET', 'POST', 'DELETE'])
-def handle_favorite_character(user_id, character_id):
+    results = batch_favorites(user_id, data.get('action'), data.get('items'))
+    return jsonify({'results': results}), 200
 
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'msg': 'User not found'}), 404
-
-    character = Character.query.get(character_id)
-    if not character:
-        return jsonify({'msg': 'Character not found'}), 404
 
+@app.route('/user/<int:user_id>/favorites/character/<int:character_id>', methods=['GET', 'POST', 'DELETE'])
+@read_primary
+def handle_favorite_character(user_id, character_id):
     if request.method == 'GET':
-        favorite = Favorites.query.filter_by(
-            user_id=user_id,
-            character_id=character_id
-        ).first()
-
-        return jsonify({
-            'is_favorite': favorite is not None,
-            'user_id': user_id,
-            'character_id': character_id
-        }), 200
+        body, status = favorite_status(user_id, 'character', character_id)
+        return jsonify(body), status
 
     elif request.method == 'POST':
-        existing = Favorites.query.filter_by(
-            user_id=user_id,
-            character_id=character_id
-        ).first()
-
-        if existing:
-            return jsonify({'msg': 'Character already in favorites'}), 400
-
-        new_favorite = Favorites(
-            user_id=user_id,
-            character_id=character_id
-        )
-
-        db.session.add(new_favorite)
-        db.session.commit()
-
-        return jsonify(new_favorite.serialize()), 201
+        body, status = add_favorite(user_id, 'character', character_id)
+        return jsonify(body), status
 
     elif request.method == 'DELETE':
-        favorite = Favorites.query.filter_by(
-            user_id=user_id,
-            character_id=character_id
-        ).first()
-
-        if not favorite:
-            return jsonify({'msg': 'Favorite not found'}), 404
-
-        db.session.delete(favorite)
-        db.session.commit()
-
-        return jsonify({'msg': 'Character removed from favorites'}), 200
+        body, status = remove_favorite(user_id, 'character', character_id)
+        return jsonify(body), status
 
 
 @app.route('/user/<int:user_id>/favorites/planet/<int:planet_id>', methods=['GET', 'POST', 'DELETE'])
+@read_primary
 def handle_favorite_planet(user_id, planet_id):
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'msg': 'User not found'}), 404
-
-    planet = Planet.query.get(planet_id)
-    if not planet:
-        return jsonify({'msg': 'Planet not found'}), 404
-
     if request.method == 'GET':
-        favorite = Favorites.query.filter_by(
-            user_id=user_id,
-            planet_id=planet_id
-        ).first()
-
-        return jsonify({
-            'is_favorite': favorite is not None,
-            'user_id': user_id,
-            'planet_id': planet_id
-        }), 200
+        body, status = favorite_status(user_id, 'planet', planet_id)
+        return jsonify(body), status
 
     elif request.method == 'POST':
-        existing = Favorites.query.filter_by(
-            user_id=user_id,
-            planet_id=planet_id
-        ).first()
-
-        if existing:
-            return jsonify({'msg': 'Planet already in favorites'}), 400
-
-        new_favorite = Favorites(
-            user_id=user_id,
-            planet_id=planet_id
-        )
-
-        db.session.add(new_favorite)
-        db.session.commit()
-
-        return jsonify(new_favorite.serialize()), 201
+        body, status = add_favorite(user_id, 'planet', planet_id)
+        return jsonify(body), status
 
     elif request.method == 'DELETE':
-        favorite = Favorites.query.filter_by(
-            user_id=user_id,
-            planet_id=planet_id
-        ).first()
-
-        if not favorite:
-            return jsonify({'msg': 'Favorite not found'}), 404
-
-        db.session.delete(favorite)
-        db.session.commit()
-
-        return jsonify({'msg': 'Planet removed from favorites'}), 200
+        body, status = remove_favorite(user_id, 'planet', planet_id)
+        return jsonify(body), status
 
 
 @app.route('/user/<int:user_id>/favorites/vehicle/<int:vehicle_id>', methods=['GET', 'POST', 'DELETE'])
+@read_primary
 def handle_favorite_vehicle(user_id, vehicle_id):
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'msg': 'User not found'}), 404
-
-    vehicle = Vehicle.query.get(vehicle_id)
-    if not vehicle:
-        return jsonify({'msg': 'Vehicle not found'}), 404
-
     if request.method == 'GET':
-        favorite = Favorites.query.filter_by(
-            user_id=user_id,
-            vehicle_id=vehicle_id
-        ).first()
-
-        return jsonify({
-            'is_favorite': favorite is not None,
-            'user_id': user_id,
-            'vehicle_id': vehicle_id
-        }), 200
+        body, status = favorite_status(user_id, 'vehicle', vehicle_id)
+        return jsonify(body), status
 
     elif request.method == 'POST':
-        existing = Favorites.query.filter_by(
-            user_id=user_id,
-            vehicle_id=vehicle_id
-        ).first()
-
-        if existing:
-            return jsonify({'msg': 'Vehicle already in favorites'}), 400
-
-        new_favorite = Favorites(
-            user_id=user_id,
-            vehicle_id=vehicle_id
-        )
-
-        db.session.add(new_favorite)
-        db.session.commit()
-
-        return jsonify(new_favorite.serialize()), 201
+        body, status = add_favorite(user_id, 'vehicle', vehicle_id)
+        return jsonify(body), status
 
     elif request.method == 'DELETE':
-        favorite = Favorites.query.filter_by(
-            user_id=user_id,
-            vehicle_id=vehicle_id
-        ).first()
-
-        if not favorite:
-            return jsonify({'msg': 'Favorite not found'}), 404
-
-        db.session.delete(favorite)
-        db.session.commit()
+        body, status = remove_favorite(user_id, 'vehicle', vehicle_id)
+        return jsonify(body), status
 
-        return jsonify({'msg': 'Vehicle removed from favorites'}), 200
 
+if not app.config['API_ONLY']:
+    # imported here so API-only workers never load Flask-Admin and WTForms
+    from admin import setup_admin
+    setup_admin(app)
+    register_swagger(app)
 
-setup_admin(app)
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
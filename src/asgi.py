@@ -0,0 +1,49 @@
+# This file serves the same Flask app on an ASGI server:
+#   uvicorn asgi:application --app-dir src/ --workers 2
+# Views and the database driver stay synchronous, so each request runs on a
+# bounded thread pool instead of blocking the whole worker process while it
+# waits on the database. Size ASGI_THREADS to DB_POOL_SIZE + DB_MAX_OVERFLOW
+# so threads don't queue on the connection pool.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from app import app
+
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 10))
+executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi')
+
+
+class ThreadPoolWsgiToAsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs WSGI apps thread-sensitively, i.e. one request at a time on
+    # a single shared thread; fan out to the pool instead. This re-wraps the
+    # undecorated method behind asgiref's @sync_to_async, which is not public
+    # API, so asgiref is pinned in the Pipfile
+
+    run_wsgi_app = sync_to_async(
+        WsgiToAsgiInstance.__dict__['run_wsgi_app'].func,
+        thread_sensitive=False,
+        executor=executor)
+
+
+class ThreadPoolWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        await ThreadPoolWsgiToAsgiInstance(self.wsgi_application)(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = ThreadPoolWsgiToAsgi(app)
@@ -0,0 +1,144 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import g
+from models import TableVersion
+
+
+class MemoryBackend:
+    """Bounded LRU with a per-entry TTL, local to one worker process."""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    """Shared backend for any Redis-compatible server, so every gunicorn
+    worker sees the same entries and invalidations."""
+
+    def __init__(self, url, ttl=300):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_URL points to Redis but the redis package is not installed')
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self._client.set(key, json.dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def delete_prefix(self, prefix):
+        keys = list(self._client.scan_iter(match=prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+    def clear(self):
+        self.delete_prefix('')
+
+
+class EntityCache:
+    """Read-through cache of serialized entities keyed by table, id and the
+    write version of every table the serialized entity reads.
+
+    Any write bumps a version (see TableVersion), so older entries become
+    unreachable in every worker at once and age out through the LRU or the
+    TTL; nothing has to be invalidated by hand.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        url = app.config.get('CACHE_URL')
+        maxsize = app.config.get('CACHE_MAXSIZE', 1024)
+        ttl = app.config.get('CACHE_TTL', 300)
+        if url:
+            self.backend = RedisBackend(url, ttl=ttl)
+        else:
+            self.backend = MemoryBackend(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _key(model, entity_id, depends):
+        tables = [model.__tablename__, *(other.__tablename__ for other in depends)]
+        # conditional_get has usually read these for the ETag already
+        versions = g.get('table_versions') or {}
+        if not versions.keys() >= set(tables):
+            versions = TableVersion.current(tables)
+        marker = ".".join(str(versions[name]) for name in tables)
+        return f"{model.__tablename__}:{marker}:{entity_id}"
+
+    def fetch(self, model, entity_id, query=None, depends=()):
+        """Return model.serialize() for `entity_id`, or None if it doesn't
+        exist. `depends` lists the other models serialize() embeds. Misses
+        are not cached so a later POST is seen immediately."""
+        key = self._key(model, entity_id, depends)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        query = query if query is not None else model.query
+        obj = query.filter_by(id=entity_id).first()
+        if obj is None:
+            return None
+        value = obj.serialize()
+        self.backend.set(key, value)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else None
+        }
+
+
+entity_cache = EntityCache()
@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from sqlalchemy.pool import QueuePool, NullPool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options_from_env(db_url):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from DB_* environment variables.
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT and DB_POOL_RECYCLE size
+    the per-worker pool; DB_POOL_PRE_PING checks connections before use.
+    DB_PGBOUNCER=1 (or DB_POOL_CLASS=null) hands pooling to PgBouncer: no
+    connections are kept in the worker, and psycopg 3 stops preparing
+    statements, which transaction-mode PgBouncer can't route.
+    """
+    options = {
+        'pool_pre_ping': _env_flag('DB_POOL_PRE_PING', True),
+        # hosted Postgres plans close idle connections server-side
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 300)),
+    }
+
+    pgbouncer = _env_flag('DB_PGBOUNCER', False)
+    if pgbouncer or os.getenv('DB_POOL_CLASS', '').lower() == 'null':
+        options['poolclass'] = NullPool
+    elif ':memory:' not in db_url:
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 5)),
+            pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        )
+
+    if pgbouncer and db_url.startswith('postgresql+psycopg:'):
+        options['connect_args'] = {'prepare_threshold': None}
+    return options
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(
+            checkouts=pool.checkouts,
+            timeouts=pool.timeouts,
+            wait_total_seconds=round(pool.wait_total, 6),
+            wait_max_seconds=round(pool.wait_max, 6),
+            wait_avg_seconds=round(pool.wait_total / pool.checkouts, 6) if pool.checkouts else 0.0,
+        )
+    return stats
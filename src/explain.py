@@ -0,0 +1,71 @@
+import click
+from sqlalchemy import select, text
+from models import db, User, Character, Planet, Vehicle, Favorites, FavoriteCount
+
+
+def hot_queries():
+    """The lookups the API runs on every request or cascade, by name."""
+    return {
+        'user favorites': select(Favorites).where(Favorites.user_id == 1),
+        'favorite by user and character': select(Favorites).where(
+            Favorites.user_id == 1, Favorites.character_id == 1),
+        'favorites of a character': select(Favorites).where(Favorites.character_id == 1),
+        'favorites of a planet': select(Favorites).where(Favorites.planet_id == 1),
+        'favorites of a vehicle': select(Favorites).where(Favorites.vehicle_id == 1),
+        'characters of a planet': select(Character).where(Character.homeplanet_id == 1),
+        'characters of a vehicle': select(Character).where(Character.vehicle_id == 1),
+        'characters of a planet page': select(Character).where(Character.homeplanet_id.in_([1, 2, 3])),
+        'character page': select(Character).where(Character.id > 1).order_by(Character.id).limit(50),
+        'planet page': select(Planet).where(Planet.id > 1).order_by(Planet.id).limit(50),
+        'vehicle page': select(Vehicle).where(Vehicle.id > 1).order_by(Vehicle.id).limit(50),
+        'user page': select(User).where(User.id > 1).order_by(User.id).limit(50),
+        'character by name': select(Character).where(Character.name == 'x'),
+        'most favorited characters': select(FavoriteCount).where(
+            FavoriteCount.subject == 'character', FavoriteCount.count > 0
+        ).order_by(FavoriteCount.count.desc(), FavoriteCount.subject_id.desc()).limit(10),
+    }
+
+
+def _postgres_seq_scans(plan):
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        found.extend(_postgres_seq_scans(child))
+    return found
+
+
+def sequential_scans(statement):
+    """Return the tables `statement` would read with a full scan."""
+    connection = db.session.connection()
+    dialect = connection.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect.name == 'postgresql':
+        # small tables make the planner prefer a seq scan even when a usable
+        # index exists; switch them off so only a missing index shows up
+        connection.execute(text('SET LOCAL enable_seqscan = off'))
+        plan = connection.execute(text('EXPLAIN (FORMAT JSON) ' + sql)).scalar()
+        return _postgres_seq_scans(plan[0]['Plan'])
+
+    if dialect.name == 'sqlite':
+        rows = connection.execute(text('EXPLAIN QUERY PLAN ' + sql)).all()
+        return [row[-1].split()[1] for row in rows
+                if row[-1].startswith('SCAN ') and ' USING ' not in row[-1]]
+
+    raise click.ClickException(f'EXPLAIN check not supported on {dialect.name}')
+
+
+def register_commands(app):
+    @app.cli.command('explain-check')
+    def explain_check():
+        """Fail if any hot query falls back to a sequential scan."""
+        failures = 0
+        for name, statement in hot_queries().items():
+            scans = sequential_scans(statement)
+            status = 'SEQ SCAN on ' + ', '.join(scans) if scans else 'ok'
+            failures += bool(scans)
+            click.echo(f'{name:35} {status}')
+        db.session.rollback()
+        if failures:
+            raise click.ClickException(f'{failures} queries use a sequential scan')
@@ -0,0 +1,437 @@
+import logging
+from sqlalchemy import select, insert, delete, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from models import db, User, Character, Planet, Vehicle, Favorites
+from utils import APIException
+from stats import adjust_counts, favorite_deltas
+from write_behind import favorite_queue
+
+logger = logging.getLogger(__name__)
+
+# favorite type -> (model, foreign key column on Favorites)
+FAVORITE_TYPES = {
+    'character': (Character, 'character_id'),
+    'planet': (Planet, 'planet_id'),
+    'vehicle': (Vehicle, 'vehicle_id'),
+}
+
+
+def _missing_message(user_id, kind, entity_id):
+    # only reached once a write has already failed or matched nothing
+    if db.session.get(User, user_id) is None:
+        return 'User not found'
+    if db.session.get(FAVORITE_TYPES[kind][0], entity_id) is None:
+        return f'{kind.capitalize()} not found'
+    return None
+
+
+def _insert_ignore(target=Favorites):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(target).on_conflict_do_nothing()
+    if dialect == 'sqlite':
+        return sqlite.insert(target).on_conflict_do_nothing()
+    return None
+
+
+def add_favorite(user_id, kind, entity_id):
+    """Insert one favorite and return a (body, status) pair.
+
+    The unique constraints and foreign keys on favorites do the checking:
+    a duplicate inserts nothing and an unknown user or entity fails the
+    foreign key, so the happy path is a single INSERT ... RETURNING plus
+    the favorite_counts upsert.
+    """
+    if favorite_queue.enabled:
+        return _queue_toggle(user_id, kind, entity_id, True)
+
+    values = {'user_id': user_id, FAVORITE_TYPES[kind][1]: entity_id}
+    statement = _insert_ignore()
+    try:
+        if statement is not None:
+            favorite = db.session.scalars(
+                statement.values(**values).returning(Favorites)).first()
+        else:
+            # no ON CONFLICT support: let the unique constraint raise instead
+            favorite = Favorites(**values)
+            db.session.add(favorite)
+            db.session.flush()
+        body = favorite.serialize() if favorite is not None else None
+        if body is not None:
+            adjust_counts(favorite_deltas(user_id, [(kind, entity_id)], 1))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        body = None
+
+    if body is not None:
+        return body, 201
+
+    message = _missing_message(user_id, kind, entity_id)
+    if message:
+        return {'msg': message}, 404
+    return {'msg': f'{kind.capitalize()} already in favorites'}, 400
+
+
+def remove_favorite(user_id, kind, entity_id):
+    if favorite_queue.enabled:
+        return _queue_toggle(user_id, kind, entity_id, False)
+
+    column = getattr(Favorites, FAVORITE_TYPES[kind][1])
+    result = db.session.execute(
+        delete(Favorites).where(Favorites.user_id == user_id, column == entity_id))
+    if result.rowcount:
+        adjust_counts(favorite_deltas(user_id, [(kind, entity_id)], -1))
+    db.session.commit()
+
+    if result.rowcount == 0:
+        return {'msg': _missing_message(user_id, kind, entity_id) or 'Favorite not found'}, 404
+    return {'msg': f'{kind.capitalize()} removed from favorites'}, 200
+
+
+def favorite_state(user_id, kind, entity_id):
+    """Return (user exists, entity exists, is favorite) from one query, with
+    a queued toggle for the pair taking precedence over the stored row."""
+    model, column_name = FAVORITE_TYPES[kind]
+    column = getattr(Favorites, column_name)
+    user_exists, entity_exists, is_favorite = db.session.execute(select(
+        select(User.id).where(User.id == user_id).exists(),
+        select(model.id).where(model.id == entity_id).exists(),
+        select(Favorites.id).where(Favorites.user_id == user_id, column == entity_id).exists(),
+    )).one()
+    queued = favorite_queue.state(user_id, kind, entity_id)
+    if queued is not None:
+        is_favorite = queued
+    return bool(user_exists), bool(entity_exists), bool(is_favorite)
+
+
+def favorite_status(user_id, kind, entity_id):
+    user_exists, entity_exists, is_favorite = favorite_state(user_id, kind, entity_id)
+    if not user_exists:
+        return {'msg': 'User not found'}, 404
+    if not entity_exists:
+        return {'msg': f'{kind.capitalize()} not found'}, 404
+    return {
+        'is_favorite': is_favorite,
+        'user_id': user_id,
+        FAVORITE_TYPES[kind][1]: entity_id
+    }, 200
+
+
+def _queue_toggle(user_id, kind, entity_id, present):
+    # validated against the database plus the queue, then acknowledged
+    # before it is written
+    body, status = favorite_status(user_id, kind, entity_id)
+    if status != 200:
+        return body, status
+    if present and body['is_favorite']:
+        return {'msg': f'{kind.capitalize()} already in favorites'}, 400
+    if not present and not body['is_favorite']:
+        return {'msg': 'Favorite not found'}, 404
+
+    favorite_queue.put(user_id, kind, entity_id, present)
+    action = 'added to' if present else 'removed from'
+    return {'msg': f'{kind.capitalize()} {action} favorites'}, 202
+
+
+def _pending_item(user_id, kind, entity_id, expand):
+    # stands in for a favorite that is queued but not yet inserted
+    item = {
+        'id': None,
+        'user_id': user_id,
+        'character_id': None,
+        'planet_id': None,
+        'vehicle_id': None,
+        FAVORITE_TYPES[kind][1]: entity_id,
+        'created_at': None,
+    }
+    if expand:
+        for other in FAVORITE_TYPES:
+            item[other] = None
+        related = db.session.get(FAVORITE_TYPES[kind][0], entity_id)
+        item[kind] = related.serialize() if related else None
+    return item
+
+
+def _favorite_key(item):
+    for kind, (_, column_name) in FAVORITE_TYPES.items():
+        if item[column_name] is not None:
+            return kind, item[column_name]
+    return None
+
+
+def user_favorites(user_id, expand=False):
+    """Return the user's favorites, or None if the user doesn't exist.
+
+    Users are outer-joined to their favorites so existence and the list come
+    back from the same query. With `expand`, the favorited character (with
+    its homeplanet and vehicle), planet or vehicle is joined in as well and
+    embedded in each item. Toggles still in the write-behind queue are
+    applied on top, so the caller always sees its own writes.
+    """
+    query = (
+        select(User.id, Favorites)
+        .outerjoin(Favorites, Favorites.user_id == User.id)
+        .where(User.id == user_id)
+        .order_by(Favorites.id))
+    if expand:
+        query = query.options(
+            joinedload(Favorites.character).joinedload(Character.homeplanet),
+            joinedload(Favorites.character).joinedload(Character.vehicle),
+            joinedload(Favorites.planet),
+            joinedload(Favorites.vehicle))
+
+    rows = db.session.execute(query).all()
+    if not rows:
+        return None
+
+    favorites = []
+    for _, favorite in rows:
+        if favorite is None:
+            continue
+        item = favorite.serialize()
+        if expand:
+            for kind in FAVORITE_TYPES:
+                related = getattr(favorite, kind)
+                item[kind] = related.serialize() if related else None
+        favorites.append(item)
+
+    overlay = favorite_queue.overlay(user_id)
+    if overlay:
+        favorites = [item for item in favorites if overlay.get(_favorite_key(item), True)]
+        stored = {_favorite_key(item) for item in favorites}
+        favorites += [_pending_item(user_id, kind, entity_id, expand)
+                      for (kind, entity_id), present in overlay.items()
+                      if present and (kind, entity_id) not in stored]
+    return favorites
+
+
+def parse_items(items):
+    """Validate a list of {"type": ..., "id": ...} dicts into (type, id) pairs."""
+    if not isinstance(items, list) or not items:
+        raise APIException('items must be a non-empty list', status_code=400)
+
+    pairs = []
+    for index, item in enumerate(items):
+        if (not isinstance(item, dict) or item.get('type') not in FAVORITE_TYPES
+                or not isinstance(item.get('id'), int)):
+            raise APIException(f'Invalid favorite item at index {index}', status_code=400)
+        pairs.append((item['type'], item['id']))
+    return pairs
+
+
+def _ids_by_type(pairs):
+    grouped = {}
+    for kind, entity_id in pairs:
+        grouped.setdefault(kind, set()).add(entity_id)
+    return grouped
+
+
+def existing_favorites(user_id, pairs):
+    """Map (type, id) -> Favorites.id for the pairs the user already has,
+    using one query for all types."""
+    grouped = _ids_by_type(pairs)
+    conditions = [
+        getattr(Favorites, FAVORITE_TYPES[kind][1]).in_(ids)
+        for kind, ids in grouped.items()
+    ]
+    rows = db.session.execute(
+        select(Favorites.id, Favorites.character_id, Favorites.planet_id, Favorites.vehicle_id)
+        .where(Favorites.user_id == user_id, or_(*conditions)))
+
+    return {_row_pair(character_id, planet_id, vehicle_id): favorite_id
+            for favorite_id, character_id, planet_id, vehicle_id in rows}
+
+
+def _row_pair(character_id, planet_id, vehicle_id):
+    for kind, entity_id in (('character', character_id), ('planet', planet_id),
+                            ('vehicle', vehicle_id)):
+        if entity_id is not None:
+            return kind, entity_id
+    return None
+
+
+def existing_entities(pairs):
+    """Return the set of (type, id) pairs that exist, one IN query per type."""
+    found = set()
+    for kind, ids in _ids_by_type(pairs).items():
+        model = FAVORITE_TYPES[kind][0]
+        found.update((kind, entity_id)
+                     for entity_id in db.session.scalars(select(model.id).where(model.id.in_(ids))))
+    return found
+
+
+def _effective_favorites(user_id, pairs):
+    # stored favorites among `pairs`, with queued toggles applied
+    found = set(existing_favorites(user_id, pairs))
+    for key, present in favorite_queue.overlay(user_id).items():
+        if present:
+            found.add(key)
+        else:
+            found.discard(key)
+    return found
+
+
+def check_favorites(user_id, pairs):
+    found = _effective_favorites(user_id, pairs)
+    return [{'type': kind, 'id': entity_id, 'is_favorite': (kind, entity_id) in found}
+            for kind, entity_id in pairs]
+
+
+def _insert_new_favorites(user_id, rows):
+    """Insert `rows` ({(type, id): values}) and return the pairs that were
+    actually inserted.
+
+    Like add_favorite, this is insert-first: rows that already exist, even
+    ones a concurrent request inserted a moment ago, are skipped by ON
+    CONFLICT DO NOTHING and left out of the RETURNING rows. Without ON
+    CONFLICT support the existing ones are looked up first instead.
+    """
+    # Core insert: the ORM bulk path splits rows by which ids are NULL,
+    # turning a mixed batch into one INSERT per run of the same type
+    statement = _insert_ignore(Favorites.__table__)
+    if statement is None:
+        found = existing_favorites(user_id, list(rows))
+        rows = {pair: values for pair, values in rows.items() if pair not in found}
+        if rows:
+            db.session.execute(insert(Favorites.__table__), list(rows.values()))
+        return set(rows)
+
+    table = Favorites.__table__
+    inserted = db.session.execute(
+        statement.returning(table.c.character_id, table.c.planet_id, table.c.vehicle_id),
+        list(rows.values()))
+    return {_row_pair(*row) for row in inserted}
+
+
+def add_favorites(user_id, pairs):
+    entities = existing_entities(pairs)
+    new_rows = {
+        (kind, entity_id): {
+            'user_id': user_id,
+            'character_id': None,
+            'planet_id': None,
+            'vehicle_id': None,
+            FAVORITE_TYPES[kind][1]: entity_id,
+        }
+        for kind, entity_id in pairs if (kind, entity_id) in entities
+    }
+    created = _insert_new_favorites(user_id, new_rows) if new_rows else set()
+    if created:
+        adjust_counts(favorite_deltas(user_id, list(created), 1))
+
+    results = []
+    reported = set()
+    for kind, entity_id in pairs:
+        key = (kind, entity_id)
+        if key not in entities:
+            status = 'not_found'
+        elif key in created and key not in reported:
+            status = 'created'
+        else:
+            status = 'exists'
+        reported.add(key)
+        results.append({'type': kind, 'id': entity_id, 'status': status})
+    return results
+
+
+def remove_favorites(user_id, pairs):
+    found = existing_favorites(user_id, pairs)
+
+    if found:
+        db.session.execute(delete(Favorites).where(Favorites.id.in_(set(found.values()))))
+        adjust_counts(favorite_deltas(user_id, list(found), -1))
+    return [{'type': kind, 'id': entity_id,
+             'status': 'removed' if (kind, entity_id) in found else 'not_found'}
+            for kind, entity_id in pairs]
+
+
+def queue_favorites(user_id, pairs, present):
+    """Validate a batch add (present=True) or remove like add_favorites and
+    remove_favorites do, but queue the accepted toggles instead of writing."""
+    found = _effective_favorites(user_id, pairs)
+    entities = existing_entities(pairs) if present else None
+
+    results = []
+    for kind, entity_id in pairs:
+        key = (kind, entity_id)
+        if present and key not in entities:
+            status = 'not_found'
+        elif present:
+            status = 'exists' if key in found else 'created'
+        else:
+            status = 'removed' if key in found else 'not_found'
+        if status in ('created', 'removed'):
+            favorite_queue.put(user_id, kind, entity_id, present)
+            if present:
+                found.add(key)
+            else:
+                found.discard(key)
+        results.append({'type': kind, 'id': entity_id, 'status': status})
+    return results
+
+
+BATCH_ACTIONS = {
+    'check': check_favorites,
+    'add': add_favorites,
+    'remove': remove_favorites,
+}
+
+QUEUED_BATCH_ACTIONS = {
+    'add': lambda user_id, pairs: queue_favorites(user_id, pairs, True),
+    'remove': lambda user_id, pairs: queue_favorites(user_id, pairs, False),
+}
+
+
+def batch_favorites(user_id, action, items):
+    if action not in BATCH_ACTIONS:
+        raise APIException('action must be one of: check, add, remove', status_code=400)
+    pairs = parse_items(items)
+    if db.session.get(User, user_id) is None:
+        raise APIException('User not found', status_code=404)
+    if favorite_queue.enabled and action in QUEUED_BATCH_ACTIONS:
+        return QUEUED_BATCH_ACTIONS[action](user_id, pairs)
+    results = BATCH_ACTIONS[action](user_id, pairs)
+    db.session.commit()
+    return results
+
+
+def _write_user_toggles(user_id, toggles):
+    adds = [key for key, present in toggles.items() if present]
+    removes = [key for key, present in toggles.items() if not present]
+    if adds:
+        add_favorites(user_id, adds)
+    if removes:
+        remove_favorites(user_id, removes)
+
+
+def write_queued_favorites(batch):
+    """Persist a write-behind batch of {(user_id, type, id): present}.
+
+    Everything goes out in one transaction through the batch helpers, which
+    skip favorites that already exist or are already gone and keep the
+    counters in step. If a user was deleted after their toggles were
+    accepted, the insert fails its foreign key; the batch is then retried
+    one user per transaction and that user's toggles are dropped.
+    """
+    by_user = {}
+    for (user_id, kind, entity_id), present in batch.items():
+        by_user.setdefault(user_id, {})[(kind, entity_id)] = present
+
+    try:
+        for user_id, toggles in sorted(by_user.items()):
+            _write_user_toggles(user_id, toggles)
+        db.session.commit()
+        return
+    except IntegrityError:
+        db.session.rollback()
+
+    for user_id, toggles in sorted(by_user.items()):
+        try:
+            _write_user_toggles(user_id, toggles)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            logger.warning('Dropped %d queued favorite toggles for user %s', len(toggles), user_id)
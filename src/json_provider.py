@@ -0,0 +1,39 @@
+import os
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson.
+
+    Falls back to the stdlib encoder for calls that pass json.dumps-only
+    keyword arguments. Keys are not sorted, which orjson would otherwise
+    have to do for every object.
+    """
+
+    def _dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=self.default)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """Use orjson when it is installed, unless JSON_PROVIDER=stdlib."""
+    if orjson is not None and os.getenv('JSON_PROVIDER', 'orjson') != 'stdlib':
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,43 @@
+import click
+from flask import jsonify
+
+
+class LazyMigrateGroup(click.Group):
+    """Placeholder for Flask-Migrate's `flask db` group.
+
+    Flask-Migrate imports Alembic, which is the largest import in the app
+    and only ever used by the CLI. This group registers the real extension
+    the first time a `flask db` command is looked up and hands over to it,
+    so web workers never import either.
+    """
+
+    def __init__(self, app, db, **kwargs):
+        super().__init__(name='db', help='Perform database migrations.', **kwargs)
+        self._app = app
+        self._db = db
+        self._group = None
+
+    def _load(self):
+        if self._group is None:
+            from flask_migrate import Migrate
+            Migrate(self._app, self._db)
+            self._group = self._app.cli.commands['db']
+        return self._group
+
+    def list_commands(self, ctx):
+        return self._load().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._load().get_command(ctx, name)
+
+
+def init_migrate(app, db):
+    app.cli.add_command(LazyMigrateGroup(app, db))
+
+
+def register_swagger(app):
+    @app.route('/swagger.json', methods=['GET'])
+    def swagger_spec():
+        # flask_swagger and its YAML parser load on the first spec request
+        from flask_swagger import swagger
+        return jsonify(swagger(app)), 200
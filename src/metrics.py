@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from flask import g, request, has_request_context, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from utils import internal_only
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RouteStats:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    def observe(self, seconds, queries, db_seconds):
+        index = bisect_left(LATENCY_BUCKETS, seconds)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+        self.count += 1
+        self.seconds += seconds
+        self.queries += queries
+        self.db_seconds += db_seconds
+
+
+class Metrics:
+    """Per-route latency histograms plus query count and DB time, collected
+    in this worker process and exposed in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self.query_warning = 20
+
+    def init_app(self, app):
+        self.query_warning = app.config.get('QUERY_COUNT_WARNING', self.query_warning)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', internal_only(self.export))
+
+    @staticmethod
+    def _before_request():
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db_seconds = 0.0
+
+    def _after_request(self, response):
+        if 'metrics_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        queries, db_seconds = g.metrics_queries, g.metrics_db_seconds
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if route == '/metrics':
+            return response
+
+        with self._lock:
+            key = (request.method, route)
+            if key not in self._routes:
+                self._routes[key] = RouteStats()
+            self._routes[key].observe(elapsed, queries, db_seconds)
+
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, '
+            f'db;dur={db_seconds * 1000:.1f};desc="{queries} queries"')
+        if queries > self.query_warning:
+            logger.warning('%s %s ran %d queries (limit %d), possible N+1',
+                           request.method, request.path, queries, self.query_warning)
+        return response
+
+    def export(self):
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            routes = sorted(self._routes.items())
+            for (method, route), stats in routes:
+                labels = f'method="{method}",route="{route}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {stats.seconds}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+            lines += [
+                '# HELP http_request_db_queries_total SQL statements run by route.',
+                '# TYPE http_request_db_queries_total counter',
+            ]
+            for (method, route), stats in routes:
+                lines.append(f'http_request_db_queries_total{{method="{method}",route="{route}"}} {stats.queries}')
+
+            lines += [
+                '# HELP http_request_db_seconds_total Time spent in SQL by route.',
+                '# TYPE http_request_db_seconds_total counter',
+            ]
+            for (method, route), stats in routes:
+                lines.append(f'http_request_db_seconds_total{{method="{method}",route="{route}"}} {stats.db_seconds}')
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_query_start'].pop()
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_queries += 1
+        g.metrics_db_seconds += time.perf_counter() - started
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute
+    starts = exception_context.connection.info.get('metrics_query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+metrics = Metrics()
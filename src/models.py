@@ -1,10 +1,23 @@
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String, Boolean, Text, ForeignKey, DateTime, func, UniqueConstraint
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Boolean, Text, ForeignKey, DateTime, func, UniqueConstraint, event, select, update, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapped, mapped_column, relationship, joinedload
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+@event.listens_for(Engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys unless asked to; the favorites write path
+    # relies on them to reject unknown users and entities
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
 
 class User(db.Model):
     __tablename__ = "users"
@@ -25,7 +38,8 @@ class User(db.Model):
 
     favorites: Mapped[List["Favorites"]] = relationship(
         back_populates="user", 
-        cascade="all, delete-orphan")
+        cascade="all, delete-orphan",
+        passive_deletes=True)
 
 
     def serialize(self):
@@ -51,18 +65,66 @@ class Character(db.Model):
         String(15),
         nullable=True)
     homeplanet_id: Mapped[Optional[int]] = mapped_column(
-        ForeignKey("planets.id"), 
-        nullable=True)
+        ForeignKey("planets.id", ondelete="SET NULL"), 
+        nullable=True,
+        index=True)
     vehicle_id: Mapped[Optional[int]] = mapped_column(
-        ForeignKey("vehicles.id"), 
-        nullable=True)
+        ForeignKey("vehicles.id", ondelete="SET NULL"), 
+        nullable=True,
+        index=True)
     homeplanet: Mapped[Optional["Planet"]] = relationship(back_populates="characters")
     vehicle: Mapped[Optional["Vehicle"]] = relationship(back_populates="characters")
 
     favorites: Mapped[List["Favorites"]] = relationship(
         back_populates="character",
-        cascade="all, delete-orphan")
+        cascade="all, delete-orphan",
+        passive_deletes=True)
+
+    @classmethod
+    def eager_query(cls):
+        # serialize() embeds homeplanet and vehicle; load both in the same
+        # SELECT so listing N characters stays a single query instead of 1 + 2N
+        return cls.query.options(
+            joinedload(cls.homeplanet),
+            joinedload(cls.vehicle))
     
+    @classmethod
+    def row_query(cls):
+        # same data as eager_query() + serialize(), but as plain column tuples
+        # so list endpoints can skip building Character/Planet/Vehicle objects
+        return db.session.query(
+            cls.id, cls.name, cls.gender, cls.birth_year,
+            cls.homeplanet_id, cls.vehicle_id,
+            Planet.name.label("homeplanet_name"),
+            Planet.climate.label("homeplanet_climate"),
+            Vehicle.name.label("vehicle_name"),
+            Vehicle.model.label("vehicle_model"),
+            Vehicle.manufacturer.label("vehicle_manufacturer")
+        ).outerjoin(Planet, cls.homeplanet_id == Planet.id
+        ).outerjoin(Vehicle, cls.vehicle_id == Vehicle.id)
+
+    @staticmethod
+    def serialize_row(row) -> Dict[str, Any]:
+        return {
+            "id": row.id,
+            "name": row.name,
+            "gender": row.gender,
+            "birth_year": row.birth_year,
+            "homeplanet_id": row.homeplanet_id,
+            "homeplanet": {
+                "id": row.homeplanet_id,
+                "name": row.homeplanet_name,
+                "climate": row.homeplanet_climate
+            } if row.homeplanet_name is not None else None,
+            "vehicle_id": row.vehicle_id,
+            "vehicle": {
+                "id": row.vehicle_id,
+                "name": row.vehicle_name,
+                "model": row.vehicle_model,
+                "manufacturer": row.vehicle_manufacturer
+            } if row.vehicle_name is not None else None
+        }
+
     def serialize(self) -> Dict[str, Any]:
         return {
             "id": self.id,
@@ -88,10 +150,13 @@ class Planet(db.Model):
         String(50),
         nullable=True)
     
-    characters: Mapped[List["Character"]] = relationship(back_populates="homeplanet")
+    characters: Mapped[List["Character"]] = relationship(
+        back_populates="homeplanet",
+        passive_deletes=True)
     favorites: Mapped[List["Favorites"]] = relationship(
         back_populates="planet",
-        cascade="all, delete-orphan")
+        cascade="all, delete-orphan",
+        passive_deletes=True)
     
     def serialize(self) -> Dict[str, Any]:
         return {
@@ -117,10 +182,13 @@ class Vehicle(db.Model):
         unique=True, 
         nullable=True)
     
-    characters: Mapped[List["Character"]] = relationship(back_populates="vehicle")
+    characters: Mapped[List["Character"]] = relationship(
+        back_populates="vehicle",
+        passive_deletes=True)
     favorites: Mapped[List["Favorites"]] = relationship(
         back_populates="vehicle",
-        cascade="all, delete-orphan")
+        cascade="all, delete-orphan",
+        passive_deletes=True)
     
     def serialize(self) -> Dict[str, Any]:
         return {
@@ -135,17 +203,20 @@ class Favorites(db.Model):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(
-        ForeignKey("users.id"),
+        ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False)
     character_id: Mapped[Optional[int]] = mapped_column(
-        ForeignKey("characters.id"),
-        nullable=True)
+        ForeignKey("characters.id", ondelete="CASCADE"),
+        nullable=True,
+        index=True)
     planet_id: Mapped[Optional[int]] = mapped_column(
-        ForeignKey("planets.id"),
-        nullable=True)
+        ForeignKey("planets.id", ondelete="CASCADE"),
+        nullable=True,
+        index=True)
     vehicle_id: Mapped[Optional[int]] = mapped_column(
-        ForeignKey("vehicles.id"),
-        nullable=True)
+        ForeignKey("vehicles.id", ondelete="CASCADE"),
+        nullable=True,
+        index=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now())
@@ -174,3 +245,60 @@ class Favorites(db.Model):
         }
 
 
+class FavoriteCount(db.Model):
+    """Running number of favorites per user and per favorited character,
+    planet or vehicle, kept up to date by the favorites write paths so the
+    top of each list is an index scan rather than a GROUP BY over favorites."""
+    __tablename__ = "favorite_counts"
+
+    subject: Mapped[str] = mapped_column(String(20), primary_key=True)
+    subject_id: Mapped[int] = mapped_column(primary_key=True)
+    count: Mapped[int] = mapped_column(nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index("ix_favorite_counts_subject_count", "subject", "count", "subject_id"),
+    )
+
+
+class TableVersion(db.Model):
+    """Per-table write counter used to build ETags without re-running the
+    list or detail queries. Bumped automatically on every ORM flush."""
+    __tablename__ = "table_versions"
+
+    # only tables some ETag reads; favorites and users are written far more
+    # often, and tracking them would add an UPDATE on a hot row to each write
+    TRACKED = frozenset({"characters", "planets", "vehicles"})
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(nullable=False, default=0)
+
+    @classmethod
+    def current(cls, names) -> Dict[str, int]:
+        rows = db.session.execute(
+            select(cls.name, cls.version).where(cls.name.in_(names)))
+        versions = dict.fromkeys(names, 0)
+        versions.update(rows.all())
+        return versions
+
+    @classmethod
+    def bump(cls, connection, names):
+        table = cls.__table__
+        # fixed order so concurrent writers lock the rows the same way
+        for name in sorted(cls.TRACKED.intersection(names)):
+            updated = connection.execute(
+                update(table)
+                .where(table.c.name == name)
+                .values(version=table.c.version + 1))
+            if updated.rowcount == 0:
+                connection.execute(insert(table).values(name=name, version=1))
+
+
+@event.listens_for(db.session, "after_flush")
+def _bump_table_versions(session, flush_context):
+    names = {
+        obj.__tablename__
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if not isinstance(obj, TableVersion)
+    }
+    if names:
+        TableVersion.bump(session.connection(), names)
@@ -0,0 +1,63 @@
+import base64
+import hashlib
+import hmac
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+ALGORITHM = 'pbkdf2_sha256'
+
+
+class PasswordHasher:
+    """PBKDF2-SHA256 hashing on a small bounded thread pool.
+
+    hashlib releases the GIL while it runs, so hashing on the pool lets the
+    other threads of a worker keep serving requests, and the pool size caps
+    how many CPU-heavy hashes run at once. The pool only limits concurrency:
+    ``hash`` and ``verify`` still wait for the result, so it helps threaded or
+    ASGI serving, not sync workers, where the worker is blocked either way.
+    Hashes are stored as ``pbkdf2_sha256$<iterations>$<salt>$<hash>``, so
+    changing the work factor only affects new hashes; old ones are upgraded on
+    the next login.
+    """
+
+    def __init__(self, iterations=600000, workers=2):
+        self.iterations = iterations
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+
+    def init_app(self, app):
+        self.iterations = app.config.get('PASSWORD_HASH_ITERATIONS', self.iterations)
+        workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+
+    @staticmethod
+    def _derive(password, salt, iterations):
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+
+    def _encode(self, password):
+        salt = secrets.token_bytes(16)
+        digest = self._derive(password, salt, self.iterations)
+        return '$'.join([
+            ALGORITHM,
+            str(self.iterations),
+            base64.b64encode(salt).decode(),
+            base64.b64encode(digest).decode(),
+        ])
+
+    def _check(self, password, stored):
+        parts = stored.split('$')
+        if len(parts) != 4 or parts[0] != ALGORITHM:
+            # rows created before hashing was added hold the plain password
+            return hmac.compare_digest(password.encode(), stored.encode()), True
+        iterations, salt, digest = int(parts[1]), base64.b64decode(parts[2]), base64.b64decode(parts[3])
+        matches = hmac.compare_digest(self._derive(password, salt, iterations), digest)
+        return matches, iterations != self.iterations
+
+    def hash(self, password):
+        return self._executor.submit(self._encode, password).result()
+
+    def verify(self, password, stored):
+        """Return (matches, needs_rehash)."""
+        return self._executor.submit(self._check, password, stored).result()
+
+
+password_hasher = PasswordHasher()
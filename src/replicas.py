@@ -0,0 +1,131 @@
+import itertools
+import logging
+import threading
+import time
+from flask import g, request, current_app, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, Select
+from sqlalchemy.exc import OperationalError
+from db_pool import engine_options_from_env, pool_stats
+
+logger = logging.getLogger(__name__)
+
+
+def read_primary(view):
+    """Keep a GET view on the primary, for reads that must see the caller's
+    own writes straight away."""
+    view.read_primary = True
+    return view
+
+
+class ReplicaRouter:
+    """Round-robin over the replica engines, skipping unhealthy ones.
+
+    GET requests are served from a replica unless the view is marked with
+    @read_primary; everything else, and any statement issued while the
+    session is flushing, goes to the primary. A replica that fails to
+    connect or drops its connection is taken out of rotation for
+    REPLICA_RETRY_SECONDS, and the GET that hit the failure is run again
+    on the primary.
+    """
+
+    def __init__(self):
+        self.retry_seconds = 30
+        self._lock = threading.Lock()
+        self._engines = {}
+        self._down_until = {}
+        self._order = itertools.cycle(())
+        self._db = None
+
+    def init_app(self, app, db):
+        self._db = db
+        self.retry_seconds = app.config.get('REPLICA_RETRY_SECONDS', self.retry_seconds)
+        urls = [url.strip().replace("postgres://", "postgresql://")
+                for url in (app.config.get('DATABASE_REPLICA_URLS') or '').split(',')
+                if url.strip()]
+        if not urls:
+            return
+
+        # plain engines rather than Flask-SQLAlchemy binds, so create_all(),
+        # drop_all() and migrations never touch the replicas
+        self._engines = {
+            f'replica_{index}': create_engine(url, **engine_options_from_env(url))
+            for index, url in enumerate(urls)
+        }
+        self._order = itertools.cycle(list(self._engines))
+        for key, engine in self._engines.items():
+            event.listen(engine, 'handle_error', self._on_error(key))
+        app.before_request(self._route_request)
+        app.register_error_handler(OperationalError, self._failover)
+
+    @property
+    def enabled(self):
+        return bool(self._engines)
+
+    def _on_error(self, key):
+        def handle_error(context):
+            # connect failures arrive without a connection
+            if context.is_disconnect or context.connection is None:
+                self.mark_down(key)
+                if has_request_context():
+                    g.replica_failed = True
+        return handle_error
+
+    def mark_down(self, key):
+        with self._lock:
+            self._down_until[key] = time.monotonic() + self.retry_seconds
+        logger.warning('Replica %s unavailable, reading from the primary for %ss',
+                       key, self.retry_seconds)
+
+    def pick(self):
+        """Next healthy replica engine, or None to use the primary."""
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self._engines)):
+                key = next(self._order)
+                if self._down_until.get(key, 0) <= now:
+                    return self._engines[key]
+        return None
+
+    def _route_request(self):
+        view = current_app.view_functions.get(request.endpoint)
+        info = self._db.session.info
+        info.pop('replica_engine', None)
+        info['read_replica'] = (
+            request.method == 'GET' and not getattr(view, 'read_primary', False))
+
+    def _failover(self, error):
+        session = self._db.session
+        if not (session.info.get('read_replica') and g.pop('replica_failed', False)):
+            raise error
+        session.rollback()
+        session.info['read_replica'] = False
+        session.info.pop('replica_engine', None)
+        view = current_app.view_functions[request.endpoint]
+        return current_app.make_response(
+            current_app.ensure_sync(view)(**(request.view_args or {})))
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            down_until = dict(self._down_until)
+        return {key: {**pool_stats(engine), 'healthy': down_until.get(key, 0) <= now}
+                for key, engine in self._engines.items()}
+
+
+replica_router = ReplicaRouter()
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends SELECTs to a read replica when
+    the current request allows it (see ReplicaRouter)."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and self.info.get('read_replica') and not self._flushing
+                and isinstance(clause, Select)):
+            # stay on one replica for the whole request
+            if 'replica_engine' not in self.info:
+                self.info['replica_engine'] = replica_router.pick()
+            if self.info['replica_engine'] is not None:
+                return self.info['replica_engine']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
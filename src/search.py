@@ -0,0 +1,170 @@
+import logging
+import threading
+from bisect import bisect_left
+from flask import current_app
+from sqlalchemy import select
+from models import db, Character, Planet, Vehicle, TableVersion
+
+logger = logging.getLogger(__name__)
+
+# table -> (result type, model, searchable columns)
+SOURCES = {
+    'characters': ('character', Character, ('name',)),
+    'planets': ('planet', Planet, ('name',)),
+    'vehicles': ('vehicle', Vehicle, ('name', 'model', 'manufacturer')),
+}
+
+
+class PrefixIndex:
+    """Sorted list of (token, entry) pairs; a prefix query is one bisect plus
+    a scan over the matching run, so lookups stay O(log n + k)."""
+
+    def __init__(self, entries):
+        pairs = sorted(
+            (token, position)
+            for position, entry in enumerate(entries)
+            for token in set(entry['_text'].split()))
+        self.entries = entries
+        self.tokens = [token for token, _ in pairs]
+        self.positions = [position for _, position in pairs]
+
+    def matches(self, prefix):
+        """(token, entry) for every token starting with `prefix`, in token order."""
+        start = bisect_left(self.tokens, prefix)
+        for index in range(start, len(self.tokens)):
+            if not self.tokens[index].startswith(prefix):
+                break
+            yield self.tokens[index], self.entries[self.positions[index]]
+
+
+class SearchIndex:
+    """In-process prefix index over character, planet and vehicle names.
+
+    A search compares each table's table_versions counter with the version
+    its index was built from. When the counter has moved on, the current
+    index keeps answering while one background thread per worker rebuilds
+    the stale tables and swaps them in, so writes made by any worker show up
+    within a rebuild and searches never wait for one. Only the first search
+    in a worker builds inline, since there is nothing to serve before it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._indexes = {}
+        self._versions = {}
+        self._wanted = set()
+        self._builder = None
+
+    def _build(self, table):
+        kind, model, columns = SOURCES[table]
+        rows = db.session.execute(
+            select(model.id, *[getattr(model, column) for column in columns]))
+        entries = []
+        for row in rows:
+            values = [value for value in row[1:] if value]
+            entries.append({
+                'type': kind,
+                'id': row[0],
+                'name': row[1],
+                '_text': ' '.join(values).casefold(),
+            })
+        # ties on a token keep this order, which has to match search()'s sort
+        entries.sort(key=lambda entry: (entry['name'].casefold(), entry['id']))
+        return PrefixIndex(entries)
+
+    def _load(self, tables):
+        with self._build_lock:
+            # versions first, so an index is never tagged newer than its rows
+            versions = TableVersion.current(tables)
+            for table in tables:
+                if versions[table] <= self._versions.get(table, -1):
+                    continue
+                index = self._build(table)
+                with self._lock:
+                    # a replica read may be behind what is loaded already
+                    if versions[table] > self._versions.get(table, -1):
+                        self._indexes[table] = index
+                        self._versions[table] = versions[table]
+
+    def _rebuild(self, app):
+        try:
+            with app.app_context():
+                while True:
+                    with self._lock:
+                        tables, self._wanted = sorted(self._wanted), set()
+                        if not tables:
+                            self._builder = None
+                            return
+                    self._load(tables)
+        except Exception:
+            logger.exception('Rebuilding the search index failed, serving the previous one')
+            with self._lock:
+                self._builder = None
+
+    def refresh(self):
+        versions = TableVersion.current(list(SOURCES))
+        missing = [table for table in SOURCES if table not in self._indexes]
+        if missing:
+            self._load(missing)
+
+        with self._lock:
+            stale = {table for table, version in versions.items()
+                     if version > self._versions.get(table, -1)}
+            if not stale:
+                return
+            self._wanted |= stale
+            # a forked worker inherits the attribute but not the thread
+            if self._builder is None or not self._builder.is_alive():
+                self._builder = threading.Thread(
+                    target=self._rebuild, args=(current_app._get_current_object(),),
+                    name='search-index', daemon=True)
+                self._builder.start()
+
+    def clear(self):
+        """Forget every index, e.g. after the tables were dropped and their
+        versions restarted."""
+        with self._build_lock, self._lock:
+            self._indexes.clear()
+            self._versions.clear()
+
+    def search(self, query, types=None, limit=10):
+        """Entries with a token starting with every word of `query`.
+
+        Results are ordered by the token that matched the longest word, then
+        by name, so "Zed Alpha" sorts under "alpha" for the query "a". That
+        is the order the index is walked in, which lets each type stop after
+        `limit` matches and still return exactly the first `limit` overall.
+        """
+        words = query.casefold().split()
+        if not words:
+            return []
+        self.refresh()
+
+        # look up the longest word, then require every other word to prefix
+        # some token of the same entry
+        anchor = max(words, key=len)
+        results = []
+        for table, (kind, _, _) in SOURCES.items():
+            if types and kind not in types:
+                continue
+            seen = set()
+            for matched, entry in self._indexes[table].matches(anchor):
+                # an entry comes up once per matching token; the first is the
+                # smallest, which is the one it sorts by
+                if entry['id'] in seen:
+                    continue
+                tokens = entry['_text'].split()
+                if all(any(token.startswith(word) for token in tokens) for word in words):
+                    seen.add(entry['id'])
+                    results.append((matched, entry))
+                    if len(seen) >= limit:
+                        break
+
+        results.sort(key=lambda result: (
+            result[0], result[1]['name'].casefold(), result[1]['type'], result[1]['id']))
+        return [{key: value for key, value in entry.items() if key != '_text'}
+                for _, entry in results[:limit]]
+
+
+search_index = SearchIndex()
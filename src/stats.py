@@ -0,0 +1,161 @@
+import click
+from sqlalchemy import select, update, insert, delete, func, text
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, User, Character, Planet, Vehicle, Favorites, FavoriteCount
+
+# counter subject -> (model, its column on Favorites, column shown in stats)
+SUBJECTS = {
+    'user': (User, Favorites.user_id, User.username),
+    'character': (Character, Favorites.character_id, Character.name),
+    'planet': (Planet, Favorites.planet_id, Planet.name),
+    'vehicle': (Vehicle, Favorites.vehicle_id, Vehicle.name),
+}
+
+
+def _counterparts(subject):
+    # a favorite links one user to one entity
+    return [other for other in SUBJECTS if other != 'user'] if subject == 'user' else ['user']
+
+
+def _upsert():
+    table = FavoriteCount.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(table)
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(table)
+    else:
+        return None
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.subject, table.c.subject_id],
+        set_={'count': table.c.count + statement.excluded['count']})
+
+
+def adjust_counts(deltas):
+    """Add each delta of {(subject, id): delta} to its counter.
+
+    Runs in the caller's transaction so counters commit together with the
+    favorites they describe. Keys are applied in sorted order so concurrent
+    writers lock counter rows the same way.
+    """
+    rows = [{'subject': subject, 'subject_id': subject_id, 'count': delta}
+            for (subject, subject_id), delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    statement = _upsert()
+    if statement is not None:
+        db.session.execute(statement, rows)
+        return
+
+    table = FavoriteCount.__table__
+    for row in rows:
+        updated = db.session.execute(
+            update(table)
+            .where(table.c.subject == row['subject'], table.c.subject_id == row['subject_id'])
+            .values(count=table.c.count + row['count']))
+        if updated.rowcount == 0:
+            db.session.execute(insert(table).values(**row))
+
+
+def favorite_deltas(user_id, pairs, delta):
+    """Counter changes for adding (delta=1) or removing (delta=-1) the
+    favorites `pairs` of (type, id) for one user."""
+    deltas = {('user', user_id): delta * len(pairs)}
+    for kind, entity_id in pairs:
+        deltas[(kind, entity_id)] = deltas.get((kind, entity_id), 0) + delta
+    return deltas
+
+
+def forget(subject, subject_id):
+    """Take a user or entity that is about to be deleted off the counters.
+
+    ON DELETE CASCADE removes its favorites without the application seeing
+    them, so each counterpart it was paired with is decremented here with
+    one set-based UPDATE, and its own counter is dropped. Call it in the
+    same transaction as the DELETE.
+    """
+    own_column = SUBJECTS[subject][1]
+    for other in _counterparts(subject):
+        other_column = SUBJECTS[other][1]
+        db.session.execute(
+            update(FavoriteCount)
+            .where(FavoriteCount.subject == other,
+                   FavoriteCount.subject_id.in_(
+                       select(other_column).where(own_column == subject_id)))
+            .values(count=FavoriteCount.count - 1))
+    db.session.execute(
+        delete(FavoriteCount)
+        .where(FavoriteCount.subject == subject, FavoriteCount.subject_id == subject_id))
+
+
+def top(subject, limit):
+    """The `limit` users or entities with the most favorites, read from the
+    (subject, count, subject_id) index."""
+    model, _, label = SUBJECTS[subject]
+    rows = db.session.execute(
+        select(FavoriteCount.subject_id, label, FavoriteCount.count)
+        .join(model, model.id == FavoriteCount.subject_id)
+        .where(FavoriteCount.subject == subject, FavoriteCount.count > 0)
+        .order_by(FavoriteCount.count.desc(), FavoriteCount.subject_id.desc())
+        .limit(limit))
+    return [{'id': subject_id, label.key: name, 'favorites': count}
+            for subject_id, name, count in rows]
+
+
+def characters_per_planet(limit):
+    # characters change rarely and homeplanet_id is indexed, so this one is
+    # grouped on the fly instead of kept in a counter
+    count = func.count(Character.id)
+    rows = db.session.execute(
+        select(Planet.id, Planet.name, count.label('characters'))
+        .join(Character, Character.homeplanet_id == Planet.id)
+        .group_by(Planet.id, Planet.name)
+        .order_by(count.desc(), Planet.id.desc())
+        .limit(limit))
+    return [{'id': planet_id, 'name': name, 'characters': total}
+            for planet_id, name, total in rows]
+
+
+def summary(limit):
+    return {
+        'most_favorited': {kind: top(kind, limit) for kind in _counterparts('user')},
+        'top_users': top('user', limit),
+        'characters_per_planet': characters_per_planet(limit),
+    }
+
+
+def reconcile():
+    """Recount favorites and correct every counter that drifted.
+
+    Returns the number of counters changed. On PostgreSQL the counter table
+    is locked first so no favorite write commits between the recount and
+    the fix.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(text('LOCK TABLE favorite_counts IN SHARE ROW EXCLUSIVE MODE'))
+
+    actual = {}
+    for subject, (_, column, _) in SUBJECTS.items():
+        rows = db.session.execute(
+            select(column, func.count()).where(column.isnot(None)).group_by(column))
+        actual.update(((subject, subject_id), total) for subject_id, total in rows)
+    stored = {
+        (subject, subject_id): count
+        for subject, subject_id, count in db.session.execute(
+            select(FavoriteCount.subject, FavoriteCount.subject_id, FavoriteCount.count))
+    }
+
+    deltas = {key: actual.get(key, 0) - stored.get(key, 0) for key in actual.keys() | stored.keys()}
+    drifted = sum(1 for delta in deltas.values() if delta)
+    adjust_counts(deltas)
+    db.session.execute(delete(FavoriteCount).where(FavoriteCount.count <= 0))
+    db.session.commit()
+    return drifted
+
+
+def register_stats_commands(app):
+    @app.cli.command('reconcile-stats')
+    def reconcile_stats():
+        """Recount favorites into favorite_counts; run it periodically."""
+        drifted = reconcile()
+        click.echo(f'{drifted} counters corrected')
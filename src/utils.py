@@ -1,4 +1,20 @@
-from flask import jsonify, url_for
+import base64
+import hashlib
+import hmac
+import json
+from functools import wraps
+from itertools import islice
+from urllib.parse import urlencode
+from flask import g, jsonify, url_for, request, current_app, Response, stream_with_context, make_response, abort
+from sqlalchemy import insert, delete
+from sqlalchemy.exc import IntegrityError
+from models import db, TableVersion
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 1000
+BULK_CHUNK_SIZE = 1000
 
 class APIException(Exception):
     status_code = 400
@@ -15,17 +31,311 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _is_value_of(value, python_type):
+    # bool is an int subclass, but never a valid id or sort key
+    return isinstance(value, python_type) and not isinstance(value, bool)
+
+def decode_cursor(cursor, key_column=None):
+    """Decode a cursor made by encode_cursor. With `key_column`, the cursor
+    must also carry a sort key "k" of that column's type."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise APIException('Invalid cursor', status_code=400)
+    if not isinstance(payload, dict) or not _is_value_of(payload.get("id"), int):
+        raise APIException('Invalid cursor', status_code=400)
+    if key_column is not None:
+        if "k" not in payload:
+            raise APIException('Cursor does not match sort', status_code=400)
+        if not _is_value_of(payload["k"], key_column.type.python_type):
+            raise APIException('Invalid cursor', status_code=400)
+    return payload
+
+def get_page_size():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def apply_order(query, model, order=None):
+    """Order by `order` = (column, descending), always breaking ties on id."""
+    if order is None or order[0] is model.id:
+        descending = order is not None and order[1]
+        return query.order_by(model.id.desc() if descending else model.id)
+    column, descending = order
+    if descending:
+        return query.order_by(column.desc(), model.id.desc())
+    return query.order_by(column, model.id)
+
+def paginate(query, model, order=None):
+    """Keyset pagination, on the primary key unless `order` says otherwise.
+
+    Reads `limit` and `cursor` from the query string and returns the rows of
+    the requested page plus the URL of the next one (None on the last page).
+    The cursor holds the sort key and id of the last row, and the next page
+    filters on them instead of using OFFSET, so deep pages are as cheap as
+    the first one. Sort columns must be non-nullable.
+    """
+    column, descending = order if order is not None else (model.id, False)
+    limit = get_page_size()
+    cursor = request.args.get('cursor')
+    if cursor:
+        payload = decode_cursor(cursor, None if column is model.id else column)
+        if column is model.id:
+            query = query.filter(
+                model.id < payload["id"] if descending else model.id > payload["id"])
+        else:
+            key, last_id = payload["k"], payload["id"]
+            if descending:
+                query = query.filter((column < key) | ((column == key) & (model.id < last_id)))
+            else:
+                query = query.filter((column > key) | ((column == key) & (model.id > last_id)))
+
+    rows = apply_order(query, model, order).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = {"id": rows[-1].id}
+    if column is not model.id:
+        last["k"] = getattr(rows[-1], column.key)
+    # built from the current URL rather than url_for, whose keywords and
+    # view args would clash with query keys such as planet_id or endpoint
+    args = request.args.copy()
+    args['cursor'] = encode_cursor(last)
+    args['limit'] = limit
+    next_url = request.base_url + '?' + urlencode(list(args.items(multi=True)))
+    return rows, next_url
+
+def page_response(items, next_url):
+    return jsonify({"results": items, "next": next_url})
+
+def wants_stream():
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+def stream_response(query, model, order=None, serialize=None, expand=None):
+    """Stream every row of `query` as newline-delimited JSON.
+
+    Rows are fetched from the cursor in batches with yield_per and written
+    out one by one, so memory stays flat however large the table is.
+    `expand`, if given, is called with each batch of serialized items
+    before they are written, e.g. to embed related rows with one query
+    per batch.
+    """
+    serialize = serialize or (lambda row: row.serialize())
+
+    def generate():
+        try:
+            rows = iter(apply_order(query, model, order).yield_per(STREAM_BATCH_SIZE))
+            while batch := [serialize(row) for row in islice(rows, STREAM_BATCH_SIZE)]:
+                if expand is not None:
+                    expand(batch)
+                for item in batch:
+                    yield current_app.json.dumps(item) + "\n"
+        finally:
+            # the request's app context, and with it db.session, was torn
+            # down before the body is iterated; the query's session then
+            # opened a new transaction that nothing else would end
+            query.session.close()
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+def conditional_get(*models):
+    """Answer GET requests with a strong ETag derived from the write version
+    of every table the response reads, the full request path and the
+    negotiated representation (JSON page or NDJSON stream).
+
+    A matching If-None-Match gets a 304 straight away, without running the
+    view's query or serializing anything.
+    """
+    tables = [model.__tablename__ for model in models]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+
+            versions = g.table_versions = TableVersion.current(tables)
+            marker = ",".join(f"{name}={versions[name]}" for name in tables)
+            representation = NDJSON_MIMETYPE if wants_stream() else 'application/json'
+            etag = hashlib.sha1(
+                f"{marker}|{representation}|{request.full_path}".encode()).hexdigest()
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                response.vary.add('Accept')
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.vary.add('Accept')
+            return response
+        return wrapper
+    return decorator
+
+def _existing_values(model, column, values):
+    column = getattr(model, column)
+    values = list(values)
+    found = set()
+    for start in range(0, len(values), BULK_CHUNK_SIZE):
+        chunk = values[start:start + BULK_CHUNK_SIZE]
+        found.update(db.session.scalars(db.select(column).where(column.in_(chunk))))
+    return found
+
+def _referenced(model, field):
+    """(model, column name) that `field` of `model` points to, or None if
+    it is not a foreign key."""
+    keys = model.__table__.c[field].foreign_keys
+    if not keys:
+        return None
+    target = next(iter(keys)).column
+    for mapper in db.Model.registry.mappers:
+        if mapper.local_table is target.table:
+            return mapper.class_, target.name
+    return None
+
+def field_error(model, row):
+    """Why `row` can't be stored in `model`'s columns, or None if it can."""
+    for field, value in row.items():
+        column = model.__table__.c[field]
+        if value is None:
+            if not column.nullable:
+                return f'{field} is required'
+            continue
+        expected = column.type.python_type
+        if not _is_value_of(value, expected):
+            return f'{field} must be {"an integer" if expected is int else "a string"}'
+        if expected is str and column.type.length and len(value) > column.type.length:
+            return f'{field} must be at most {column.type.length} characters'
+    return None
+
+def bulk_create(model, items, fields, unique):
+    """Insert many rows of `model` in one transaction.
+
+    Every field is checked against its column's type first. Foreign keys
+    and uniqueness of every column in `unique` are then checked for the
+    whole batch with one IN query per column (chunked), and the accepted
+    rows go out as one multi-row INSERT ... RETURNING (split into batches
+    by the driver if needed). Returns one outcome dict per input item, in
+    input order.
+    """
+    results = [None] * len(items)
+    candidates = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('name'):
+            results[index] = {'index': index, 'status': 'invalid', 'msg': 'Name is required'}
+            continue
+        row = {field: item.get(field) for field in fields}
+        error = field_error(model, row)
+        if error:
+            results[index] = {'index': index, 'status': 'invalid', 'msg': error}
+        else:
+            candidates.append((index, row))
+
+    for field in fields:
+        reference = _referenced(model, field)
+        if reference is None:
+            continue
+        target, target_column = reference
+        found = _existing_values(
+            target, target_column, {row[field] for _, row in candidates if row[field] is not None})
+        accepted = []
+        for index, row in candidates:
+            if row[field] is not None and row[field] not in found:
+                results[index] = {'index': index, 'status': 'invalid',
+                                  'msg': f'{target.__name__} not found'}
+            else:
+                accepted.append((index, row))
+        candidates = accepted
+
+    for column in unique:
+        taken = _existing_values(
+            model, column, {row[column] for _, row in candidates if row[column] is not None})
+        accepted = []
+        for index, row in candidates:
+            value = row[column]
+            if value is not None and value in taken:
+                results[index] = {'index': index, 'status': 'duplicate',
+                                  'msg': f'{column} already exists'}
+            else:
+                if value is not None:
+                    taken.add(value)
+                accepted.append((index, row))
+        candidates = accepted
+
+    if candidates:
+        # rows are matched back to their input by their first unique column,
+        # which the checks above made distinct; asking for RETURNING in
+        # parameter order instead makes SQLite send one INSERT per row
+        key = unique[0]
+        try:
+            created = db.session.execute(
+                insert(model).returning(getattr(model, key), model.id),
+                [row for _, row in candidates]).all()
+            TableVersion.bump(db.session.connection(), {model.__tablename__})
+            db.session.commit()
+        except IntegrityError:
+            # only reachable when a concurrent request wrote a conflicting
+            # row or removed a referenced one after the checks above
+            db.session.rollback()
+            raise APIException('Batch conflicted with a concurrent change, no rows were '
+                               'created; retry the request', status_code=400)
+        ids = dict(created)
+        for index, row in candidates:
+            results[index] = {'index': index, 'status': 'created', 'id': ids[row[key]]}
+
+    return results
+
+
+def delete_by_id(model, entity_id, touches=()):
+    """Delete one row of `model` with a single DELETE statement.
+
+    Dependent rows are left to the database's ON DELETE rules, so nothing
+    is loaded into the session. `touches` names other tables those rules
+    modify, so their ETags move as well. Returns False if no row matched.
+    """
+    result = db.session.execute(delete(model).where(model.id == entity_id))
+    if result.rowcount == 0:
+        db.session.rollback()
+        return False
+    TableVersion.bump(db.session.connection(), {model.__tablename__, *touches})
+    db.session.commit()
+    return True
+
+def internal_only(view):
+    """Serve a diagnostics route only to callers that send the configured
+    INTERNAL_TOKEN as a bearer token. To everyone else, and to everyone
+    when no token is configured, the route looks like it does not exist."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('INTERNAL_TOKEN')
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not token or not hmac.compare_digest(supplied.encode(), token.encode()):
+            abort(404)
+        return view(*args, **kwargs)
+    wrapper.internal = True
+    return wrapper
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
 def generate_sitemap(app):
-    links = ['/admin/']
+    links = ['/admin/'] if 'admin' in app.blueprints else []
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
-        if "GET" in rule.methods and has_no_empty_params(rule):
+        internal = getattr(app.view_functions[rule.endpoint], 'internal', False)
+        if "GET" in rule.methods and has_no_empty_params(rule) and not internal:
             url = url_for(rule.endpoint, **(rule.defaults or {}))
             if "/admin/" not in url:
                 links.append(url)
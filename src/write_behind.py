@@ -0,0 +1,119 @@
+import atexit
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class FavoriteQueue:
+    """Optional write-behind buffer for favorite toggles.
+
+    Toggles are keyed by (user_id, type, id) and only the latest one for a
+    key is kept, so add-remove-add in quick succession costs one write.
+    A background thread hands everything pending to the `write` callback
+    every `FAVORITES_FLUSH_INTERVAL` seconds, or sooner once
+    `FAVORITES_FLUSH_SIZE` keys are waiting, and the callback persists the
+    batch in one transaction. Reads apply `overlay()` on top of the
+    database so a client sees its own toggles before they are flushed.
+
+    The buffer lives in one worker process: a read served by another worker
+    only sees a toggle after the flush, and toggles still pending when a
+    worker is killed without a clean shutdown are lost. A normal exit
+    flushes through atexit.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.interval = 0.1
+        self.max_pending = 500
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pending = {}
+        self._flushing = {}
+        self._thread = None
+        self._pid = None
+        self._app = None
+        self._write = None
+
+    def init_app(self, app, write):
+        self.enabled = app.config.get('FAVORITES_WRITE_BEHIND', False)
+        self.interval = app.config.get('FAVORITES_FLUSH_INTERVAL', self.interval)
+        self.max_pending = app.config.get('FAVORITES_FLUSH_SIZE', self.max_pending)
+        self._app = app
+        self._write = write
+        if self.enabled:
+            atexit.register(self.close)
+
+    def _ensure_thread(self):
+        # started lazily so each forked worker runs its own flusher
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='favorites-flush', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def put(self, user_id, kind, entity_id, present):
+        with self._lock:
+            self._ensure_thread()
+            self._pending[(user_id, kind, entity_id)] = present
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def state(self, user_id, kind, entity_id):
+        """The queued toggle for one pair: True, False, or None if none is."""
+        key = (user_id, kind, entity_id)
+        with self._lock:
+            return self._pending.get(key, self._flushing.get(key))
+
+    def overlay(self, user_id):
+        """{(type, id): present} for the user's toggles not yet committed."""
+        with self._lock:
+            return {
+                (kind, entity_id): present
+                for source in (self._flushing, self._pending)
+                for (owner, kind, entity_id), present in source.items()
+                if owner == user_id
+            }
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._flushing, self._pending = self._pending, {}
+            try:
+                with self._app.app_context():
+                    self._write(dict(self._flushing))
+            except Exception:
+                # e.g. the database is unreachable: keep the toggles for the
+                # next flush unless a newer toggle replaced them meanwhile
+                logger.exception('Flushing %d favorite toggles failed, retrying later',
+                                 len(self._flushing))
+                with self._lock:
+                    for key, present in self._flushing.items():
+                        self._pending.setdefault(key, present)
+            finally:
+                with self._lock:
+                    self._flushing = {}
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+favorite_queue = FavoriteQueue()
@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# the app reads its configuration at import time
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+for name in ('DATABASE_REPLICA_URLS', 'CACHE_URL', 'FAVORITES_WRITE_BEHIND'):
+    os.environ.pop(name, None)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from app import app as flask_app  # noqa: E402
+from cache import entity_cache  # noqa: E402
+from models import db  # noqa: E402
+from search import search_index  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        # versions restart at 0 with the tables; drop what was built on the old ones
+        entity_cache.backend.clear()
+        search_index.clear()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# the suite's app is already imported with everything, so check a fresh one
+PROBE = '''
+import sys
+import app
+print(*[name for name in sys.argv[1:] if name in sys.modules])
+'''
+
+OPTIONAL = ('flask_admin', 'wtforms', 'flask_swagger', 'alembic')
+
+
+def loaded(tmp_path, api_only):
+    env = dict(os.environ,
+               API_ONLY=api_only,
+               DATABASE_URL='sqlite:///' + str(tmp_path / 'test.db'),
+               PYTHONPATH=SRC)
+    env.pop('DATABASE_REPLICA_URLS', None)
+    result = subprocess.run([sys.executable, '-c', PROBE, *OPTIONAL], env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def test_api_only_skips_admin_swagger_and_migrations(tmp_path):
+    assert loaded(tmp_path, '1') == []
+    # without it the admin is set up at import; swagger and migrations stay
+    # lazy either way
+    assert loaded(tmp_path, '0') == ['flask_admin', 'wtforms']
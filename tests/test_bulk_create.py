@@ -0,0 +1,52 @@
+from sqlalchemy import event
+from models import db
+
+
+def test_bulk_create_rejects_values_of_the_wrong_type(client):
+    response = client.post('/character/bulk', json=[
+        {'name': {'a': 1}},
+        {'name': ['a']},
+        {'name': 'Leia', 'homeplanet_id': '1'},
+        {'name': 'Luke', 'vehicle_id': True},
+        {'name': 'x' * 51},
+        {'name': 'Han', 'gender': 'male'},
+    ])
+    assert response.status_code == 201
+    statuses = [result['status'] for result in response.get_json()['results']]
+    assert statuses == ['invalid'] * 5 + ['created']
+
+
+def test_bulk_create_inserts_in_one_statement(client):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO planets'):
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.post('/planet/bulk', json=[
+            {'name': f'planet-{i}', 'climate': 'arid'} for i in range(50)])
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['created'] * 50
+    assert len(set(result['id'] for result in results)) == 50
+    assert len(statements) == 1
+    for result in results:
+        planet = client.get(f"/planet/{result['id']}").get_json()
+        assert planet['name'] == f"planet-{result['index']}"
+
+
+def test_bulk_create_reports_unknown_references_per_row(client):
+    planet = client.post('/planet', json={'name': 'Naboo'}).get_json()
+    response = client.post('/character/bulk', json=[
+        {'name': 'a', 'homeplanet_id': planet['id']},
+        {'name': 'b', 'homeplanet_id': 99},
+        {'name': 'c', 'vehicle_id': 99},
+    ])
+    assert response.status_code == 201
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['created', 'invalid', 'invalid']
+    assert [result.get('msg') for result in results[1:]] == ['Planet not found', 'Vehicle not found']
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import event, insert
+from models import db, Character, Planet, Vehicle
+
+
+def seed(start, count):
+    db.session.execute(insert(Planet), [
+        {'name': f'planet-{i}', 'climate': 'arid'} for i in range(start, start + count)])
+    db.session.execute(insert(Vehicle), [
+        {'name': f'vehicle-{i}', 'model': f'model-{i}', 'manufacturer': f'maker-{i}'}
+        for i in range(start, start + count)])
+    db.session.execute(insert(Character), [
+        {'name': f'character-{i}', 'homeplanet_id': i + 1, 'vehicle_id': i + 1}
+        for i in range(start, start + count)])
+    db.session.commit()
+
+
+def count_queries(client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements), response
+
+
+@pytest.mark.parametrize('url', ['/character?limit=500', '/character?stream=1'])
+def test_character_list_query_count_is_constant(client, url):
+    seed(0, 40)
+    small, response = count_queries(client, url)
+    assert response.get_data(as_text=True).count('planet-') == 40
+
+    seed(40, 360)
+    large, response = count_queries(client, url)
+    assert response.get_data(as_text=True).count('planet-') == 400
+
+    assert small == large
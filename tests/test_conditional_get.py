@@ -0,0 +1,21 @@
+from utils import NDJSON_MIMETYPE
+
+
+def test_etag_depends_on_negotiated_representation(client):
+    client.post('/planet', json={'name': 'Hoth', 'climate': 'frozen'})
+
+    stream = client.get('/planet', headers={'Accept': NDJSON_MIMETYPE})
+    page = client.get('/planet', headers={'Accept': 'application/json'})
+    assert stream.mimetype == NDJSON_MIMETYPE and page.mimetype == 'application/json'
+    assert stream.headers['ETag'] != page.headers['ETag']
+    assert 'Accept' in page.headers['Vary']
+
+    mismatched = client.get('/planet', headers={
+        'Accept': 'application/json', 'If-None-Match': stream.headers['ETag']})
+    assert mismatched.status_code == 200
+    assert mismatched.mimetype == 'application/json'
+
+    revalidated = client.get('/planet', headers={
+        'Accept': 'application/json', 'If-None-Match': page.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert 'Accept' in revalidated.headers['Vary']
@@ -0,0 +1,16 @@
+def test_unknown_references_are_rejected(client):
+    response = client.post('/character', json={'name': 'Rey', 'homeplanet_id': 999})
+    assert response.status_code == 400
+    assert response.get_json() == {'msg': 'Planet not found'}
+
+    response = client.post('/character', json={'name': 'Rey', 'vehicle_id': 999})
+    assert response.status_code == 400
+    assert response.get_json() == {'msg': 'Vehicle not found'}
+
+    response = client.post('/character', json={'name': 'Rey', 'homeplanet_id': 'Jakku'})
+    assert response.status_code == 400
+
+    planet = client.post('/planet', json={'name': 'Jakku'}).get_json()
+    response = client.post('/character', json={'name': 'Rey', 'homeplanet_id': planet['id']})
+    assert response.status_code == 201
+    assert response.get_json()['homeplanet']['name'] == 'Jakku'
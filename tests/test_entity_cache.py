@@ -0,0 +1,19 @@
+from sqlalchemy import delete
+from models import db, Planet, TableVersion
+
+
+def test_write_from_another_worker_skips_cached_entity(client):
+    response = client.post('/planet', json={'name': 'Tatooine', 'climate': 'arid'})
+    planet_id = response.get_json()['id']
+    first = client.get(f'/planet/{planet_id}')
+    assert first.status_code == 200
+    assert client.get(f'/planet/{planet_id}').status_code == 200
+
+    # what another process does: delete and bump, without touching this cache
+    with db.engine.begin() as connection:
+        connection.execute(delete(Planet.__table__).where(Planet.__table__.c.id == planet_id))
+        TableVersion.bump(connection, {'planets'})
+
+    assert client.get(f'/planet/{planet_id}').status_code == 404
+    revalidated = client.get(f'/planet/{planet_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 404
@@ -0,0 +1,37 @@
+from sqlalchemy import insert, select
+from models import db, User, Planet, Character, Favorites, FavoriteCount
+
+
+def seed():
+    db.session.execute(insert(User), [{'email': 'a@example.com', 'username': 'a',
+                                       'password': 'x', 'is_active': True}])
+    db.session.execute(insert(Planet), [{'name': 'Naboo'}, {'name': 'Endor'}])
+    db.session.execute(insert(Character), [{'name': 'Padme'}])
+    db.session.commit()
+
+
+def test_batch_add_skips_rows_inserted_by_someone_else(client):
+    seed()
+    # committed by a concurrent request after this one would have checked
+    db.session.execute(insert(Favorites), [{'user_id': 1, 'planet_id': 1}])
+    db.session.commit()
+
+    response = client.post('/user/1/favorites/batch', json={'action': 'add', 'items': [
+        {'type': 'planet', 'id': 1}, {'type': 'planet', 'id': 2},
+        {'type': 'planet', 'id': 2}, {'type': 'character', 'id': 1},
+        {'type': 'vehicle', 'id': 9}]})
+    assert response.status_code == 200
+    assert [result['status'] for result in response.get_json()['results']] == [
+        'exists', 'created', 'exists', 'created', 'not_found']
+
+    counts = dict(db.session.execute(
+        select(FavoriteCount.subject, FavoriteCount.count)
+        .where(FavoriteCount.subject == 'user')).all())
+    # the seeded row bypassed the counters, so only the two real inserts count
+    assert counts == {'user': 2}
+
+
+def test_batch_rejects_non_object_body(client):
+    seed()
+    response = client.post('/user/1/favorites/batch', json=[{'action': 'add'}])
+    assert response.status_code == 400
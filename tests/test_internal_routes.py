@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.mark.parametrize('url', ['/metrics', '/internal/pool', '/internal/cache'])
+def test_internal_routes_require_the_token(app, client, url):
+    app.config['INTERNAL_TOKEN'] = None
+    assert client.get(url).status_code == 404
+
+    app.config['INTERNAL_TOKEN'] = 'secret'
+    try:
+        assert client.get(url).status_code == 404
+        assert client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code == 404
+        assert client.get(url, headers={'Authorization': 'Bearer secret'}).status_code == 200
+        assert url not in client.get('/').get_data(as_text=True)
+    finally:
+        app.config['INTERNAL_TOKEN'] = None
@@ -0,0 +1,46 @@
+import base64
+import json
+
+import pytest
+
+
+def cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('url, payload', [
+    ('/planet?sort=name', {'id': 1, 'k': []}),
+    ('/planet?sort=name', {'id': 1, 'k': {'a': 1}}),
+    ('/planet?sort=name', {'id': 1, 'k': 5}),
+    ('/planet', {'id': True}),
+    ('/planet', {'id': '1'}),
+])
+def test_malformed_cursor_is_rejected(client, url, payload):
+    response = client.get(f'{url}&cursor={cursor(payload)}' if '?' in url
+                          else f'{url}?cursor={cursor(payload)}')
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid cursor'
+
+
+def test_cursor_pages_through_sorted_list(client):
+    client.post('/planet/bulk', json=[{'name': f'planet-{i:02}'} for i in range(5)])
+    names, url = [], '/planet?sort=-name&limit=2'
+    while url:
+        page = client.get(url).get_json()
+        names += [planet['name'] for planet in page['results']]
+        url = page['next']
+    assert names == [f'planet-{i:02}' for i in reversed(range(5))]
+
+
+@pytest.mark.parametrize('query', ['planet_id=7', '_external=1', 'endpoint=x'])
+def test_next_link_keeps_query_keys_that_clash_with_url_for(client, query):
+    planet = client.post('/planet', json={'name': 'Kamino'}).get_json()
+    client.post('/character/bulk', json=[
+        {'name': f'clone-{i}', 'homeplanet_id': planet['id']} for i in range(3)])
+
+    response = client.get(f"/planet/{planet['id']}/characters?limit=1&{query}")
+    assert response.status_code == 200
+    next_url = response.get_json()['next']
+    assert next_url.startswith(f"http://localhost/planet/{planet['id']}/characters?")
+    assert query in next_url
+    assert 'cursor=' in next_url and 'limit=1' in next_url
@@ -0,0 +1,14 @@
+def test_non_string_password_is_rejected(client):
+    response = client.post('/user', json={'email': 'a@b.c', 'username': 'a', 'password': 123})
+    assert response.status_code == 400
+    assert response.get_json() == {'msg': 'password must be a string'}
+
+    response = client.post('/user', json={'email': 'a@b.c', 'username': 'a', 'password': 'secret'})
+    assert response.status_code == 201
+
+    response = client.post('/login', json={'username': 'a', 'password': ['secret']})
+    assert response.status_code == 400
+    assert response.get_json() == {'msg': 'password must be a string'}
+
+    response = client.post('/login', json={'username': 'a', 'password': 'secret'})
+    assert response.status_code == 200
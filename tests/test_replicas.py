@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# the router is configured when the app is imported, and the suite's app has
+# no replicas, so each case runs in its own interpreter
+SCRIPT = '''
+import json, shutil, sys
+from app import app
+from models import db
+from replicas import replica_router
+
+with app.app_context():
+    db.create_all()
+client = app.test_client()
+client.post('/planet', json={'name': 'Tatooine'})
+if len(sys.argv) > 1:
+    # the replica is a snapshot taken before the next write
+    shutil.copyfile(sys.argv[1], sys.argv[2])
+client.post('/planet', json={'name': 'Hoth'})
+print(json.dumps({
+    'tatooine': client.get('/planet/1').status_code,
+    'hoth': client.get('/planet/2').status_code,
+    'healthy': [stats['healthy'] for stats in replica_router.stats().values()],
+}))
+'''
+
+
+def run(tmp_path, replica_urls, *args):
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + str(tmp_path / 'primary.db'),
+               DATABASE_REPLICA_URLS=replica_urls,
+               PYTHONPATH=SRC)
+    for name in ('CACHE_URL', 'FAVORITES_WRITE_BEHIND'):
+        env.pop(name, None)
+    result = subprocess.run([sys.executable, '-c', SCRIPT, *args], env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_gets_read_the_replica(tmp_path):
+    replica = tmp_path / 'replica.db'
+    result = run(tmp_path, 'sqlite:///' + str(replica), str(tmp_path / 'primary.db'), str(replica))
+    # the write went to the primary, the GET to the replica that hasn't got it
+    assert result == {'tatooine': 200, 'hoth': 404, 'healthy': [True]}
+
+
+def test_unopenable_replica_fails_over_to_the_primary(tmp_path):
+    result = run(tmp_path, 'sqlite:///' + str(tmp_path / 'missing' / 'replica.db'))
+    assert result == {'tatooine': 200, 'hoth': 200, 'healthy': [False]}
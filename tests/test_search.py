@@ -0,0 +1,50 @@
+import time
+
+from models import TableVersion
+from search import search_index
+
+
+def names(client, query):
+    return [result['name'] for result in client.get(f'/search?q={query}').get_json()['results']]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_stale_index_keeps_serving_while_it_rebuilds(client):
+    client.post('/planet', json={'name': 'Alderaan'})
+    assert names(client, 'alder') == ['Alderaan']
+
+    client.post('/planet', json={'name': 'Alderaan Two'})
+    # hold the build lock, as a slow rebuild of a big table would
+    with search_index._build_lock:
+        started = time.monotonic()
+        assert names(client, 'alder') == ['Alderaan']
+        assert time.monotonic() - started < 1
+    wait_for(lambda: names(client, 'alder') == ['Alderaan', 'Alderaan Two'])
+
+
+def test_older_version_from_a_lagging_replica_is_ignored(client, monkeypatch):
+    client.post('/planet', json={'name': 'Bespin'})
+    client.post('/planet', json={'name': 'Bespin Two'})
+    assert names(client, 'besp') == ['Bespin', 'Bespin Two']
+
+    current = TableVersion.current
+    monkeypatch.setattr(TableVersion, 'current', classmethod(
+        lambda cls, tables: {name: version - 1 for name, version in current(tables).items()}))
+    assert names(client, 'besp') == ['Bespin', 'Bespin Two']
+    assert search_index._builder is None or not search_index._builder.is_alive()
+
+
+def test_results_are_the_first_matches_in_token_order(client):
+    client.post('/planet/bulk', json=[{'name': 'Zed Alpha'}, {'name': 'Beta'}])
+    client.post('/character/bulk', json=[{'name': f'Amy {i}'} for i in (2, 0, 1)])
+    client.post('/vehicle/bulk', json=[{'name': 'Speeder', 'model': 'Ace'}])
+
+    # ordered by the matching word (ace < alpha < amy), not by name
+    assert names(client, 'a&limit=2') == ['Speeder', 'Zed Alpha']
+    assert names(client, 'a&limit=4') == ['Speeder', 'Zed Alpha', 'Amy 0', 'Amy 1']
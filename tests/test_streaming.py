@@ -0,0 +1,33 @@
+import threading
+
+import pytest
+from models import db
+
+
+def get_outside_app_context(client, url):
+    # the fixture's app context is per thread; a fresh thread gets its own,
+    # torn down after the view returns like under a real server
+    result = {}
+
+    def run():
+        response = client.get(url)
+        result['status'], result['body'] = response.status_code, response.get_data(as_text=True)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return result['status'], result['body']
+
+
+@pytest.mark.parametrize('url', ['/planet?stream=1', '/planet?stream=1&include=characters',
+                                 '/character?stream=1'])
+def test_stream_returns_its_connection_to_the_pool(client, url):
+    client.post('/planet/bulk', json=[{'name': f'planet-{i}'} for i in range(5)])
+    db.session.remove()
+    assert db.engine.pool.checkedout() == 0
+
+    for _ in range(3):
+        status, body = get_outside_app_context(client, url)
+        assert status == 200
+        assert body.count('\n') == (5 if 'planet' in url else 0)
+    assert db.engine.pool.checkedout() == 0